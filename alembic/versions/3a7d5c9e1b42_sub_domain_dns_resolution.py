@@ -0,0 +1,49 @@
+"""sub_domain dns resolution
+
+Revision ID: 3a7d5c9e1b42
+Revises: f2c8a9d3b615
+Create Date: 2026-10-18 16:11:27.384105
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a7d5c9e1b42'
+down_revision: Union[str, None] = 'f2c8a9d3b615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_ai AFTER INSERT ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_ad AFTER DELETE ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(sub_domain_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_au AFTER UPDATE OF name ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(sub_domain_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO sub_domain_fts(rowid, name) VALUES (new.id, new.name); END",
+)
+
+
+def upgrade() -> None:
+    op.add_column('sub_domain', sa.Column('is_live', sa.Boolean(), nullable=True))
+    op.add_column('sub_domain', sa.Column('addresses', sa.String(), nullable=True))
+    op.add_column('sub_domain', sa.Column('cname', sa.String(), nullable=True))
+    op.add_column('sub_domain', sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_sub_domain_domain_id_is_live', 'sub_domain', ['domain_id', 'is_live', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sub_domain_domain_id_is_live', table_name='sub_domain')
+    with op.batch_alter_table('sub_domain') as batch_op:
+        batch_op.drop_column('resolved_at')
+        batch_op.drop_column('cname')
+        batch_op.drop_column('addresses')
+        batch_op.drop_column('is_live')
+    # sqlite rebuilds the table for the drop, which takes the fts triggers with it
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in FTS_TRIGGERS:
+            op.execute(statement)
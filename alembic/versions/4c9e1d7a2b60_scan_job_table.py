@@ -0,0 +1,47 @@
+"""scan job table
+
+Revision ID: 4c9e1d7a2b60
+Revises: b7d2e9a41f3c
+Create Date: 2026-10-18 11:03:27.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c9e1d7a2b60'
+down_revision: Union[str, None] = 'b7d2e9a41f3c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'scan_job',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('domain', sa.String(), nullable=True),
+        sa.Column('kind', sa.String(), nullable=True),
+        sa.Column('status', sa.Enum('queued', 'running', 'complete', 'failed', name='jobstatusenum'), nullable=True),
+        sa.Column('progress', sa.JSON(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('createdDate', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('startedDate', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finishedDate', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_scan_job_id'), 'scan_job', ['id'], unique=False)
+    op.create_index(op.f('ix_scan_job_status'), 'scan_job', ['status'], unique=False)
+    op.create_index(op.f('ix_scan_job_user_id'), 'scan_job', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_scan_job_user_id'), table_name='scan_job')
+    op.drop_index(op.f('ix_scan_job_status'), table_name='scan_job')
+    op.drop_index(op.f('ix_scan_job_id'), table_name='scan_job')
+    op.drop_table('scan_job')
@@ -0,0 +1,29 @@
+"""scan_job batch_id
+
+Revision ID: 6b8e2f0a4d17
+Revises: d41a7c5e9f03
+Create Date: 2026-10-18 14:31:08.226471
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b8e2f0a4d17'
+down_revision: Union[str, None] = 'd41a7c5e9f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('scan_job', sa.Column('batch_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_scan_job_batch_id'), 'scan_job', ['batch_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_scan_job_batch_id'), table_name='scan_job')
+    with op.batch_alter_table('scan_job') as batch_op:
+        batch_op.drop_column('batch_id')
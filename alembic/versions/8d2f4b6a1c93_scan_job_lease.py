@@ -0,0 +1,29 @@
+"""scan_job lease
+
+Revision ID: 8d2f4b6a1c93
+Revises: 3a7d5c9e1b42
+Create Date: 2026-10-18 17:02:44.518326
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f4b6a1c93'
+down_revision: Union[str, None] = '3a7d5c9e1b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('scan_job', sa.Column('worker_id', sa.String(), nullable=True))
+    op.add_column('scan_job', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('scan_job') as batch_op:
+        batch_op.drop_column('heartbeat_at')
+        batch_op.drop_column('worker_id')
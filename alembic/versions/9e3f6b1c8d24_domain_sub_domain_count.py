@@ -0,0 +1,33 @@
+"""domain sub_domain_count
+
+Revision ID: 9e3f6b1c8d24
+Revises: 4c9e1d7a2b60
+Create Date: 2026-10-18 13:40:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3f6b1c8d24'
+down_revision: Union[str, None] = '4c9e1d7a2b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('domain', sa.Column('sub_domain_count', sa.Integer(), server_default='0', nullable=False))
+    # backfill from the rows already stored, the persist path keeps it current afterwards
+    op.execute("""
+        UPDATE domain SET sub_domain_count = (
+            SELECT COUNT(*) FROM sub_domain WHERE sub_domain.domain_id = domain.id
+        )
+    """)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('domain') as batch_op:
+        batch_op.drop_column('sub_domain_count')
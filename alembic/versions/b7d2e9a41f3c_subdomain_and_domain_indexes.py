@@ -0,0 +1,55 @@
+"""subdomain and domain indexes
+
+Revision ID: b7d2e9a41f3c
+Revises: 843065b07c8a
+Create Date: 2026-10-18 10:12:44.218391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e9a41f3c'
+down_revision: Union[str, None] = '843065b07c8a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # fold duplicate domains per user into the oldest row before the unique index goes on
+    op.execute("""
+        UPDATE sub_domain SET domain_id = (
+            SELECT MIN(keep.id) FROM domain dup
+            JOIN domain keep ON keep.user_id = dup.user_id AND keep.domain_name = dup.domain_name
+            WHERE dup.id = sub_domain.domain_id
+        )
+        WHERE domain_id IN (
+            SELECT id FROM domain WHERE user_id IS NOT NULL AND id NOT IN (
+                SELECT MIN(id) FROM domain WHERE user_id IS NOT NULL GROUP BY user_id, domain_name
+            )
+        )
+    """)
+    op.execute("""
+        DELETE FROM domain WHERE user_id IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM domain WHERE user_id IS NOT NULL GROUP BY user_id, domain_name
+        )
+    """)
+    op.execute("""
+        DELETE FROM sub_domain WHERE id NOT IN (
+            SELECT MIN(id) FROM sub_domain GROUP BY domain_id, name
+        )
+    """)
+
+    op.create_index('ix_domain_user_id_domain_name', 'domain', ['user_id', 'domain_name'], unique=True, if_not_exists=True)
+    op.create_index('ix_sub_domain_domain_id_name', 'sub_domain', ['domain_id', 'name'], unique=True, if_not_exists=True)
+    # covers "subdomains of a domain ordered by id" without touching the table
+    op.create_index('ix_sub_domain_domain_id_id', 'sub_domain', ['domain_id', 'id', 'name'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sub_domain_domain_id_id', table_name='sub_domain')
+    op.drop_index('ix_sub_domain_domain_id_name', table_name='sub_domain')
+    op.drop_index('ix_domain_user_id_domain_name', table_name='domain')
@@ -0,0 +1,37 @@
+"""sub_domain seen tracking
+
+Revision ID: d41a7c5e9f03
+Revises: 9e3f6b1c8d24
+Create Date: 2026-10-18 14:02:45.907316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a7c5e9f03'
+down_revision: Union[str, None] = '9e3f6b1c8d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sub_domain', sa.Column('first_seen', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('sub_domain', sa.Column('last_seen', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('sub_domain', sa.Column('seen_count', sa.Integer(), server_default='1', nullable=False))
+    # the only sighting we know of for existing rows is when they were stored. last_seen
+    # is shared per domain (its latest store) so every legacy row belongs to the "previous scan"
+    op.execute('UPDATE sub_domain SET first_seen = "createdDate", last_seen = ('
+               'SELECT max(s."createdDate") FROM sub_domain AS s WHERE s.domain_id = sub_domain.domain_id)')
+    op.create_index('ix_sub_domain_domain_id_last_seen', 'sub_domain', ['domain_id', 'last_seen'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sub_domain_domain_id_last_seen', table_name='sub_domain')
+    with op.batch_alter_table('sub_domain') as batch_op:
+        batch_op.drop_column('seen_count')
+        batch_op.drop_column('last_seen')
+        batch_op.drop_column('first_seen')
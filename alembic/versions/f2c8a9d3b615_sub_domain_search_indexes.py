@@ -0,0 +1,71 @@
+"""sub_domain search indexes
+
+Revision ID: f2c8a9d3b615
+Revises: 6b8e2f0a4d17
+Create Date: 2026-10-18 15:04:51.662930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8a9d3b615'
+down_revision: Union[str, None] = '6b8e2f0a4d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS sub_domain_fts USING fts5("
+    "name, content='sub_domain', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_ai AFTER INSERT ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_ad AFTER DELETE ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(sub_domain_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_au AFTER UPDATE OF name ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(sub_domain_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO sub_domain_fts(rowid, name) VALUES (new.id, new.name); END",
+)
+
+
+def _reverse_labels(name: str) -> str:
+    return '.'.join(reversed(name.lower().rstrip('.').split('.'))) + '.'
+
+
+def upgrade() -> None:
+    op.add_column('sub_domain', sa.Column('reversed_name', sa.String(), nullable=True))
+
+    # sql has no portable way to reverse labels, backfill in batches by id
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, name FROM sub_domain WHERE id > :last_id AND name IS NOT NULL ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        bind.execute(sa.text("UPDATE sub_domain SET reversed_name = :reversed_name WHERE id = :id"),
+                     [{"id": row.id, "reversed_name": _reverse_labels(row.name)} for row in rows])
+        last_id = rows[-1].id
+
+    op.create_index('ix_sub_domain_reversed_name', 'sub_domain', ['reversed_name'], unique=False)
+
+    if bind.dialect.name == 'sqlite':
+        for statement in FTS_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO sub_domain_fts(sub_domain_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS sub_domain_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS sub_domain_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS sub_domain_fts_ai")
+        op.execute("DROP TABLE IF EXISTS sub_domain_fts")
+    op.drop_index('ix_sub_domain_reversed_name', table_name='sub_domain')
+    with op.batch_alter_table('sub_domain') as batch_op:
+        batch_op.drop_column('reversed_name')
@@ -1,15 +1,20 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Request, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-from app.core.core import limiter
+from app.core.core import limiter, app_setting
 
-from app.schema.schema import UserCreate, DomainResponse, Token, CreateUserResponse, LoginData, LoginResponse, PaginatedDomainsResponse, PaginatedSubDomainsResponse, SubdomainSearchResponse
-from app.database.database import User, Domain, SubDomain, get_database
-from app.service.search_enumerator import get_subdomain_data, get_updated_domains
-from app.service.service import create_new_user, create_access_token, get_user_from_cookie, isAdmin, get_user, login_user, get_my_profile, get_user_domain_with_subdomains, get_user_domains, get_auth_user
+from app.schema.schema import UserCreate, DomainResponse, Token, CreateUserResponse, LoginData, LoginResponse, PaginatedDomainsResponse, PaginatedSubDomainsResponse, SubDomainItem, SubDomainSearchPage, SubdomainSearchResponse, ScanJobResponse, BatchScanRequest, BatchScanResponse
+from app.database.database import User, Domain, SubDomain, get_database, get_async_database, get_async_writer_database
+from app.service.search_enumerator import get_subdomain_data, get_updated_domains, stream_subdomain_data
+from app.service.jobs import get_job_manager, get_job, get_batch, summarize_batch
+from app.service.sources import get_source_registry
+from app.service.export import MEDIA_TYPES, export_filename, get_export_domains, stream_export
+from app.service.service import create_new_user, create_access_token, get_user_from_cookie, isAdmin, get_user, login_user, get_my_profile, get_user_domain_with_subdomains, get_user_domains as list_domains_page, get_auth_user, map_domain_summary, logout_user, search_subdomains
 
 router = APIRouter()
 
@@ -20,14 +25,15 @@ def run_health_check(db: Session = Depends(get_database)):
         db.execute(text("SELECT 1"))
         return {
             "server_status": "OK",
-            "database": "responsive"
+            "database": "responsive",
+            "sources": get_source_registry().states()
         }
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
 
-async def if_found_user(request: Request, db: Session = Depends(get_database)) -> Optional[User]:
+async def if_found_user(request: Request, db: AsyncSession = Depends(get_async_database)) -> Optional[User]:
     try:
         return await get_user_from_cookie(request, db)
     except:
@@ -37,15 +43,66 @@ async def if_found_user(request: Request, db: Session = Depends(get_database)) -
 @limiter.limit("5/minute")
 async def search_sub_domain(domain: str,
                             request: Request,
+                            deadline: Optional[float] = Query(None, gt=0, le=600),
                             user: Optional[User] = Depends(if_found_user),
-                            db: Session = Depends(get_database)):
-    data = await get_subdomain_data(domain, db, user.id if user else None)
+                            db: AsyncSession = Depends(get_async_writer_database)):
+    data = await get_subdomain_data(domain, db, user, deadline=deadline or app_setting.SCAN_DEADLINE)
     return data
 
+@router.get("/search/stream")
+@limiter.limit("5/minute")
+async def stream_sub_domain(domain: str,
+                            request: Request,
+                            user: Optional[User] = Depends(if_found_user)):
+    return StreamingResponse(
+        stream_subdomain_data(domain, user.id if user else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/jobs", response_model=ScanJobResponse, status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("5/minute")
+async def submit_scan_job(domain: str,
+                          request: Request,
+                          kind: str = Query("search", pattern="^(search|check-updates)$"),
+                          user: Optional[User] = Depends(if_found_user),
+                          db: AsyncSession = Depends(get_async_writer_database)):
+    return await get_job_manager().submit(db, domain=domain, kind=kind, user=user)
+
+
+@router.post("/search/batch", response_model=BatchScanResponse, status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("5/minute")
+async def submit_batch_scan(data: BatchScanRequest,
+                            request: Request,
+                            user: User = Depends(get_user_from_cookie),
+                            db: AsyncSession = Depends(get_async_writer_database)):
+    batch_id, jobs = await get_job_manager().submit_batch(db, domains=data.domains, kind=data.kind, user=user)
+    return summarize_batch(batch_id, jobs)
+
+
+@router.get("/search/batch/{batch_id}", response_model=BatchScanResponse)
+@limiter.limit("60/minute")
+async def read_batch_scan(batch_id: str,
+                          request: Request,
+                          user: User = Depends(get_user_from_cookie),
+                          db: AsyncSession = Depends(get_async_database)):
+    return summarize_batch(batch_id, await get_batch(db, batch_id, user))
+
+
+@router.get("/jobs/{job_id}", response_model=ScanJobResponse)
+@limiter.limit("60/minute")
+async def read_scan_job(job_id: str,
+                        request: Request,
+                        user: Optional[User] = Depends(if_found_user),
+                        db: AsyncSession = Depends(get_async_database)):
+    return await get_job(db, job_id, user)
+
+
 @router.post("/signup", response_model=CreateUserResponse)
 @limiter.limit("5/minute")
-def create_user(user: UserCreate, response: Response, request: Request, db: Session = Depends(get_database)):
-    new_user = create_new_user(user=user, db=db)
+async def create_user(user: UserCreate, response: Response, request: Request, db: AsyncSession = Depends(get_async_writer_database)):
+    new_user = await create_new_user(user=user, db=db)
     response.set_cookie(
         key="dom_explorer",
         value=f"Bearer {new_user["token"]["token"]}",
@@ -72,55 +129,126 @@ def handle_login_user(data: LoginData, request: Request, response: Response, db:
     return data
 
 
+@router.post("/logout")
+@limiter.limit("10/minute")
+def handle_logout_user(request: Request, response: Response):
+    logout_user(request)
+    response.delete_cookie(key="dom_explorer", httponly=True, secure=True, samesite="strict")
+    return {"message": "successfully logged out"}
+
+
 @router.get("/profile/me")
 @limiter.limit("5/minute")
-def my_profile(request: Request, user: User = Depends(get_user_from_cookie), db: Session = Depends(get_database)):
-    return get_my_profile(user, db)
+async def my_profile(request: Request,
+                     after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+                     limit: int = Query(20, ge=1, le=100),
+                     user: User = Depends(get_user_from_cookie),
+                     db: AsyncSession = Depends(get_async_database)):
+    return await get_my_profile(user, db, after=after, limit=limit)
 
 
 @router.get("/domains", response_model=PaginatedDomainsResponse)
 @limiter.limit("10/minute")
-async def get_user_domains(
+async def read_user_domains(
     request: Request,
-    skip: int = Query(0, ge=0),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page"),
     limit: int = Query(10, ge=1, le=100),
+    order: str = Query("id", pattern="^(id|name)$"),
+    include_total: bool = Query(False),
     current_user: User = Depends(get_user_from_cookie),
-    db: Session = Depends(get_database)
+    db: AsyncSession = Depends(get_async_database)
 ):
-    domains, total = get_user_domains(db, current_user, skip, limit)
+    domains, total, next_cursor = await list_domains_page(
+        db, current_user, after=after, limit=limit, order=order, include_total=include_total)
     return PaginatedDomainsResponse(
-        domains=domains,
+        domains=[map_domain_summary(domain) for domain in domains],
         total=total,
-        skip=skip,
-        limit=limit
+        limit=limit,
+        next_cursor=next_cursor
     )
 
 
-@router.get("/domains/{id}")
+def _export_response(domains, fmt: str, compress: bool, single: bool) -> StreamingResponse:
+    filename = export_filename(domains, fmt, compress, single)
+    return StreamingResponse(
+        stream_export(domains, fmt, compress),
+        media_type="application/gzip" if compress else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/domains/export")
+@limiter.limit("5/minute")
+async def export_user_domains(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = Query(False),
+    current_user: User = Depends(get_user_from_cookie),
+    db: AsyncSession = Depends(get_async_database)
+):
+    domains = await get_export_domains(db, current_user)
+    return _export_response(domains, format, gzip, single=False)
+
+
+@router.get("/domains/{id}/export")
+@limiter.limit("10/minute")
+async def export_user_domain(
+    request: Request,
+    id: int,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = Query(False),
+    current_user: User = Depends(get_user_from_cookie),
+    db: AsyncSession = Depends(get_async_database)
+):
+    domains = await get_export_domains(db, current_user, id)
+    return _export_response(domains, format, gzip, single=True)
+
+
+@router.get("/domains/{id}", response_model=PaginatedSubDomainsResponse)
 @limiter.limit("15/minute")
 async def read_user_domain(
     request: Request,
     id: int,
-    skip: int = Query(0, ge=0),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page"),
     limit: int = Query(10, ge=1, le=100),
+    order: str = Query("id", pattern="^(id|name)$"),
+    live: Optional[bool] = Query(None, description="only names that did (true) or did not (false) resolve"),
     current_user: User = Depends(get_user_from_cookie),
-    db: Session = Depends(get_database)
+    db: AsyncSession = Depends(get_async_database)
 ):
-    domain, total_subdomains = get_user_domain_with_subdomains(
-        db, current_user, id, skip, limit)
+    domain, subdomains, next_cursor = await get_user_domain_with_subdomains(
+        db, current_user, id, after=after, limit=limit, order=order, live=live)
     if domain is None:
         raise HTTPException(status_code=404, detail="Domain cannot be found")
-    return {
-        "domain": domain,
-        "sub_domains": domain.sub_domains,
-        "total_subdomains": total_subdomains,
-        "skip": skip,
-        "limit": limit
-    }
+    return PaginatedSubDomainsResponse(
+        domain=map_domain_summary(domain),
+        sub_domains=[SubDomainItem.model_validate(sub_domain, from_attributes=True) for sub_domain in subdomains],
+        total_subdomains=domain.sub_domain_count or 0,
+        limit=limit,
+        next_cursor=next_cursor
+    )
+
+
+@router.get("/subdomains/search", response_model=SubDomainSearchPage)
+@limiter.limit("30/minute")
+async def search_stored_subdomains(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=253),
+    mode: str = Query("suffix", pattern="^(suffix|prefix|contains)$"),
+    domain_id: Optional[int] = Query(None),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    live: Optional[bool] = Query(None, description="only names that did (true) or did not (false) resolve"),
+    current_user: User = Depends(get_user_from_cookie),
+    db: AsyncSession = Depends(get_async_database)
+):
+    items, next_cursor = await search_subdomains(
+        db, current_user, q, mode=mode, after=after, limit=limit, domain_id=domain_id, live=live)
+    return SubDomainSearchPage(items=items, limit=limit, next_cursor=next_cursor)
 
 
 @router.get("/domain/check-updates")
 @limiter.limit("5/minute")
-async def get_domain_updates(request: Request, domain: str, user: User = Depends(get_user_from_cookie), db: Session = Depends(get_database)):
-    data = await get_updated_domains(db=db, domain=domain, user=user)
+async def get_domain_updates(request: Request, domain: str, deadline: Optional[float] = Query(None, gt=0, le=600), user: User = Depends(get_user_from_cookie), db: AsyncSession = Depends(get_async_writer_database)):
+    data = await get_updated_domains(db=db, domain=domain, user=user, deadline=deadline or app_setting.SCAN_DEADLINE)
     return SubdomainSearchResponse(**data)
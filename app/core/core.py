@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from slowapi import Limiter
 from slowapi.util import get_remote_address
@@ -7,6 +8,124 @@ class AppSetting(BaseSettings):
     DATABASE_URL: str
     JWT_TOKEN: str
     ALGORITHM:str
+    # derived from DATABASE_URL (sqlite -> sqlite+aiosqlite) when not set
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # rows per multi-row insert, capped further so rows x columns stays under sqlite's 999 parameters
+    DB_INSERT_CHUNK_SIZE: int = 300
+    # rows fetched per round trip when streaming exports
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # sqlite storage profile, applied to every new connection. busy timeout is in
+    # milliseconds, mmap size in bytes, a negative cache size is in KiB
+    DB_JOURNAL_MODE: str = "wal"
+    DB_SYNCHRONOUS: str = "normal"
+    DB_BUSY_TIMEOUT: int = 5000
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024
+    DB_CACHE_SIZE: int = -64000
+    # writes go through one serialized connection, reads through a pool
+    DB_READER_POOL_SIZE: int = 10
+    DB_READER_MAX_OVERFLOW: int = 10
+    DB_WRITER_POOL_TIMEOUT: float = 30.0
+
+    # dns brute force
+    DNS_NAMESERVERS: str = "8.8.8.8,8.8.4.4"
+    DNS_WORDLIST: str = "app/wordlists/subdomains.txt"
+    DNS_CONCURRENCY: int = 200
+    DNS_TIMEOUT: float = 2.0
+    # resolve stored names in the background once a scan is saved, answers are cached
+    # for their record ttl (clamped) and misses for DNS_NEGATIVE_TTL seconds
+    DNS_ENRICH: bool = True
+    DNS_CACHE_SIZE: int = 100000
+    DNS_CACHE_MIN_TTL: int = 30
+    DNS_CACHE_MAX_TTL: int = 3600
+    DNS_NEGATIVE_TTL: int = 300
+    # random labels resolved per zone to fingerprint its wildcard record. zones
+    # where every probe gets the same answer are not brute forced at all
+    DNS_WILDCARD_PROBES: int = 3
+    DNS_WILDCARD_SKIP_STABLE: bool = True
+    # optional permutation stage after the other sources: candidates derived from
+    # discovered names, resolved up to MAX_DEPTH rounds and MAX_CANDIDATES names
+    PERMUTATIONS_ENABLED: bool = False
+    PERMUTATION_WORDS: List[str] = [
+        "dev", "test", "stage", "staging", "prod", "qa", "uat", "api", "admin", "internal", "beta", "old", "new",
+    ]
+    PERMUTATION_MAX_DEPTH: int = 2
+    PERMUTATION_MAX_CANDIDATES: int = 20000
+    PERMUTATION_ERROR_RATE: float = 0.001
+
+    # shared outbound http pool
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_MAX_PER_HOST: int = 10
+    HTTP_TIMEOUT: float = 30.0
+    HTTP_HTTP2: bool = True
+
+    # scan latency budget: overall deadline for a request (None waits for every
+    # source) and per-source timeouts in seconds
+    SCAN_DEADLINE: Optional[float] = None
+    SOURCE_TIMEOUT: float = 60.0
+    SOURCE_TIMEOUTS: Dict[str, float] = {
+        "search_engine": 120.0,
+        "crt_sh": 120.0,
+        "dns": 60.0,
+        "netcraft": 30.0,
+        "dns_dumpster": 45.0,
+        "permutations": 120.0,
+    }
+
+    # html/regex parsing: bodies above the threshold (characters) are parsed on a
+    # "thread" or "process" pool instead of the event loop
+    PARSE_EXECUTOR: str = "process"
+    PARSE_WORKERS: int = 4
+    PARSE_OFFLOAD_THRESHOLD: int = 256 * 1024
+
+    # per-source outbound rate (requests per second) and circuit breaker
+    SOURCE_RATE_LIMIT: float = 2.0
+    SOURCE_RATE_LIMITS: Dict[str, float] = {
+        "crt_sh": 1.0,
+        "netcraft": 1.0,
+        "dns_dumpster": 0.5,
+        "virustotal": 0.25,
+    }
+    SOURCE_BURST: float = 5.0
+    SOURCE_FAILURE_THRESHOLD: int = 3
+    SOURCE_RESET_TIMEOUT: float = 300.0
+    # source queries in flight at once, per source and across all scans
+    SOURCE_CONCURRENCY: int = 4
+    SOURCE_CONCURRENCIES: Dict[str, int] = {
+        "dns": 8,
+        "dns_dumpster": 2,
+    }
+    SCAN_MAX_CONCURRENCY: int = 32
+
+    # authenticated user cache, entries never outlive their token
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: float = 300.0
+
+    # background scan jobs, batches are split into one job per domain
+    SCAN_WORKERS: int = 16
+    SCAN_QUEUE_SIZE: int = 1000
+    # seconds a running job may go without a heartbeat before another process
+    # takes it to have died and requeues it, heartbeats are sent every third of it
+    SCAN_JOB_LEASE: float = 120.0
+    BATCH_MAX_DOMAINS: int = 500
+
+    # scan result cache, ttls in seconds
+    SCAN_CACHE_PATH: str = "scan_cache.db"
+    SCAN_CACHE_MEMORY_SIZE: int = 1000
+    SCAN_CACHE_TTL: int = 900
+    SCAN_CACHE_STALE_TTL: int = 3600
+    SCAN_CACHE_SOURCE_TTLS: Dict[str, int] = {
+        "crt_sh": 6 * 60 * 60,
+        "dns": 60 * 60,
+        "netcraft": 60 * 60,
+        "dns_dumpster": 60 * 60,
+        "virustotal": 6 * 60 * 60,
+        "threatcrowd": 6 * 60 * 60,
+        "passivedns": 6 * 60 * 60,
+    }
 
     model_config = SettingsConfigDict(
         env_file=".env")
@@ -15,4 +134,4 @@ class AppSetting(BaseSettings):
 app_setting = AppSetting()
 
 
-limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
+limiter = Limiter(key_func=get_remote_address)
@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine, Time, Boolean, Column, ForeignKey, Integer, String, DateTime, Enum
+from sqlalchemy import create_engine, event, DDL, Time, Boolean, Column, ForeignKey, Integer, String, DateTime, Enum, Index, JSON
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.sql import func
 from app.core.core import app_setting
 import datetime
@@ -9,10 +11,71 @@ import pytz
 
 SQLALCHEMY_DATABASE_URL = app_setting.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={
-                       "check_same_thread": False},
-                       )
+
+def _async_database_url(url: str) -> str:
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = app_setting.ASYNC_DATABASE_URL or _async_database_url(SQLALCHEMY_DATABASE_URL)
+
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+
+def _sqlite_pragmas(read_only: bool):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={app_setting.DB_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={app_setting.DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(app_setting.DB_BUSY_TIMEOUT)}")
+        cursor.execute(f"PRAGMA mmap_size={int(app_setting.DB_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size={int(app_setting.DB_CACHE_SIZE)}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return on_connect
+
+
+def _engine_options(writer: bool, poolclass) -> dict:
+    options = {}
+    if IS_SQLITE:
+        options["connect_args"] = {"check_same_thread": False}
+        options["poolclass"] = poolclass
+    if writer and IS_SQLITE:
+        # a single connection serializes writers in the pool instead of letting
+        # them fight over the sqlite write lock, servers with row locks keep a full pool
+        options.update(pool_size=1, max_overflow=0, pool_timeout=app_setting.DB_WRITER_POOL_TIMEOUT)
+    else:
+        options.update(pool_size=app_setting.DB_READER_POOL_SIZE,
+                       max_overflow=app_setting.DB_READER_MAX_OVERFLOW)
+    return options
+
+
+def _with_pragmas(engine, read_only: bool = False):
+    if IS_SQLITE:
+        event.listen(getattr(engine, "sync_engine", engine), "connect", _sqlite_pragmas(read_only))
+    return engine
+
+
+# the sync writer only runs schema setup at startup, request writes all go through
+# async_engine so there is one serialized writer while the app is serving
+engine = _with_pragmas(create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(True, QueuePool)))
+reader_engine = _with_pragmas(create_engine(
+    SQLALCHEMY_DATABASE_URL, **_engine_options(False, QueuePool)), read_only=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReaderSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=reader_engine)
+
+async_engine = _with_pragmas(create_async_engine(
+    ASYNC_DATABASE_URL, **_engine_options(True, AsyncAdaptedQueuePool)))
+async_reader_engine = _with_pragmas(create_async_engine(
+    ASYNC_DATABASE_URL, **_engine_options(False, AsyncAdaptedQueuePool)), read_only=True)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False)
+AsyncReaderSessionLocal = async_sessionmaker(
+    bind=async_reader_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -42,10 +105,15 @@ class User(Base):
 
 class Domain(Base):
     __tablename__ = "domain"
+    __table_args__ = (
+        Index("ix_domain_user_id_domain_name", "user_id", "domain_name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     domain_name = Column(String, index=True)
     isActive = Column(Boolean, default=True)
+    # maintained by the persist path so pages never need a COUNT(*)
+    sub_domain_count = Column(Integer, default=0, server_default="0", nullable=False)
     sub_domains = relationship("SubDomain", back_populates="domain")
     user_id = Column(Integer, ForeignKey('user.id'))
     user = relationship("User", back_populates="domains")
@@ -61,13 +129,32 @@ class Domain(Base):
 
 class SubDomain(Base):
     __tablename__ = "sub_domain"
+    __table_args__ = (
+        Index("ix_sub_domain_domain_id_name", "domain_id", "name", unique=True),
+        Index("ix_sub_domain_domain_id_id", "domain_id", "id", "name"),
+        Index("ix_sub_domain_domain_id_last_seen", "domain_id", "last_seen"),
+        Index("ix_sub_domain_reversed_name", "reversed_name"),
+        Index("ix_sub_domain_domain_id_is_live", "domain_id", "is_live", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     domain_id = Column(Integer, ForeignKey('domain.id'))
     domain = relationship("Domain", back_populates="sub_domains")
     name = Column(String)
+    # labels in reverse order with a trailing dot (com.example.corp.), zone and
+    # suffix lookups become a range scan on its index
+    reversed_name = Column(String, nullable=True)
     createdDate = Column(DateTime(timezone=True),
                          default=datetime.datetime.utcnow)
+    first_seen = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+    last_seen = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+    seen_count = Column(Integer, default=1, server_default="1", nullable=False)
+    # last dns answer, null until a scan has resolved the name. addresses are
+    # stored comma separated
+    is_live = Column(Boolean, nullable=True)
+    addresses = Column(String, nullable=True)
+    cname = Column(String, nullable=True)
+    resolved_at = Column(DateTime(timezone=True), nullable=True)
     
     def __str__(self):
         return f"SubDomain(id={self.id}, name='{self.name}', domain_id={self.domain_id})"
@@ -76,9 +163,71 @@ class SubDomain(Base):
         return self.__str__()
 
 
+# trigram full text index over sub_domain.name for substring search, kept in
+# sync by triggers. sqlite only, other databases fall back to LIKE
+SUB_DOMAIN_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS sub_domain_fts USING fts5("
+    "name, content='sub_domain', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_ai AFTER INSERT ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_ad AFTER DELETE ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(sub_domain_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS sub_domain_fts_au AFTER UPDATE OF name ON sub_domain BEGIN "
+    "INSERT INTO sub_domain_fts(sub_domain_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO sub_domain_fts(rowid, name) VALUES (new.id, new.name); END",
+)
+
+for _statement in SUB_DOMAIN_FTS_DDL:
+    event.listen(SubDomain.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+class JobStatusEnum(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    complete = "complete"
+    failed = "failed"
+
+
+class ScanJob(Base):
+    __tablename__ = "scan_job"
+
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('user.id'), index=True, nullable=True)
+    domain = Column(String)
+    kind = Column(String, default="search")
+    batch_id = Column(String, index=True, nullable=True)
+    status = Column(Enum(JobStatusEnum), default=JobStatusEnum.queued, index=True)
+    progress = Column(JSON, default=dict)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    createdDate = Column(DateTime(timezone=True),
+                         default=datetime.datetime.utcnow)
+    startedDate = Column(DateTime(timezone=True), nullable=True)
+    finishedDate = Column(DateTime(timezone=True), nullable=True)
+    # the process running the job and when it last said so, see SCAN_JOB_LEASE
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __str__(self):
+        return f"ScanJob(id={self.id}, domain='{self.domain}', kind='{self.kind}', status='{self.status}')"
+
+    def __repr__(self):
+        return self.__str__()
+
+
 def get_database():
-    db = SessionLocal()
+    db = ReaderSessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_database():
+    async with AsyncReaderSessionLocal() as db:
+        yield db
+
+
+async def get_async_writer_database():
+    async with AsyncSessionLocal() as db:
+        yield db
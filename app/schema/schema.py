@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional, Union, Optional, Any
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import List, Optional, Union, Optional, Any, Dict
 from datetime import datetime
 from app.database.database import RoleEnum
 
@@ -31,6 +31,8 @@ class DomainResponse(DomainBase):
     count: int
     regular: List[str] = []
     wildcards: List[str] = []
+    sources: Dict[str, str] = {}
+    partial: bool = False
 
     class ConfigDict:
         from_attributes = True
@@ -80,7 +82,9 @@ class ProfileDomain(BaseModel):
     domain: str
     isActive: bool
     createdDate: datetime
-    sub_domain: List[SubDomainResponse] = []
+    sub_domain_count: int = 0
+    wildcard_count: int = 0
+    last_scanned_at: Optional[datetime] = None
     
 class ApiResponseModel(BaseModel):
     message: str
@@ -93,24 +97,125 @@ class ProfileResponse(BaseModel):
     created_date: datetime
     role: str
     domains: List[ProfileDomain] = []
+    next_cursor: Optional[str] = None
 
     class ConfigDict:
         from_attributes = True
         
 
+class DomainSummary(BaseModel):
+    id: int
+    domain: str
+    isActive: bool
+    createdDate: datetime
+    sub_domain_count: int = 0
+
+
+def _split_addresses(value):
+    # stored comma separated on the row
+    if isinstance(value, str):
+        return value.split(",")
+    return value or []
+
+
+class SubDomainItem(BaseModel):
+    id: int
+    name: str
+    createdDate: datetime
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+    seen_count: int = 1
+    is_live: Optional[bool] = None
+    addresses: List[str] = []
+    cname: Optional[str] = None
+    resolved_at: Optional[datetime] = None
+
+    @field_validator("addresses", mode="before")
+    @classmethod
+    def split_addresses(cls, value):
+        return _split_addresses(value)
+
+    class ConfigDict:
+        from_attributes = True
+
+
+class SubDomainSearchItem(BaseModel):
+    id: int
+    name: str
+    domain: str
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+    seen_count: int = 1
+    is_live: Optional[bool] = None
+    addresses: List[str] = []
+    cname: Optional[str] = None
+    resolved_at: Optional[datetime] = None
+
+    @field_validator("addresses", mode="before")
+    @classmethod
+    def split_addresses(cls, value):
+        return _split_addresses(value)
+
+
+class SubDomainSearchPage(BaseModel):
+    items: List[SubDomainSearchItem]
+    limit: int
+    next_cursor: Optional[str] = None
+
+
 class PaginatedDomainsResponse(BaseModel):
-    domains: List[DomainResponse]
-    total: int
-    skip: int
+    domains: List[DomainSummary]
+    total: Optional[int] = None
     limit: int
+    next_cursor: Optional[str] = None
 
 
 class PaginatedSubDomainsResponse(BaseModel):
-    domain: DomainResponse
-    sub_domains: List[SubDomainResponse]
+    domain: DomainSummary
+    sub_domains: List[SubDomainItem]
     total_subdomains: int
-    skip: int
     limit: int
+    next_cursor: Optional[str] = None
+
+
+class ScanJobResponse(BaseModel):
+    id: str
+    domain: str
+    kind: str
+    status: str
+    batch_id: Optional[str] = None
+    progress: Dict[str, Any] = {}
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    createdDate: datetime
+    startedDate: Optional[datetime] = None
+    finishedDate: Optional[datetime] = None
+
+    class ConfigDict:
+        from_attributes = True
+
+
+class BatchScanRequest(BaseModel):
+    domains: List[str] = Field(..., min_length=1)
+    kind: str = Field("search", pattern="^(search|check-updates)$")
+
+
+class BatchJobItem(BaseModel):
+    id: str
+    domain: str
+    status: str
+    error: Optional[str] = None
+
+    class ConfigDict:
+        from_attributes = True
+
+
+class BatchScanResponse(BaseModel):
+    batch_id: str
+    kind: str
+    total: int
+    statuses: Dict[str, int] = {}
+    jobs: List[BatchJobItem] = []
 
 
 class SubdomainSearchResponse(BaseModel):
@@ -120,3 +225,8 @@ class SubdomainSearchResponse(BaseModel):
     wildcards: List[str]
     new_subdomains: List[str]
     new_count: bool
+    removed_subdomains: List[str] = []
+    # sources that did not complete, removals are withheld while any are listed
+    failed_sources: List[str] = []
+    sources: Dict[str, str] = {}
+    partial: bool = False
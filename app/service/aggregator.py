@@ -0,0 +1,83 @@
+import re
+import sys
+
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+_HOST_RE = re.compile(r"^(\*\.)?[a-z0-9_-]+(\.[a-z0-9_-]+)*$")
+
+
+def to_ascii(name: str) -> Optional[str]:
+    """lowercase, trailing dot dropped and unicode labels in punycode, None when
+    the name cannot be encoded."""
+    name = name.strip().lower().rstrip(".")
+    if name.isascii():
+        return name
+    try:
+        return name.encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+
+
+class ResultAggregator:
+    """every name any source reports for one domain goes through `add`.
+
+    names are normalized once (case, trailing dot, port, idna), accepted only
+    when they sit under the domain on a label boundary, interned and filed as
+    regular or wildcard. names already stored in their normal form skip all of
+    that with a single set lookup, which is what most of a big crt.sh response
+    is. per-source sets hold the same interned strings as the merged ones.
+    """
+
+    def __init__(self, domain: str):
+        self.domain = to_ascii(domain) or domain
+        self._suffix = f".{self.domain}"
+        self.regular: Set[str] = set()
+        self.wildcards: Set[str] = set()
+        # every distinct name in discovery order, so streams can resume from an offset
+        self.discovered: List[str] = []
+        self.by_source: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        self.raw_counts: Counter = Counter()
+        self.rejected: Counter = Counter()
+
+    def normalize(self, raw: str) -> Optional[str]:
+        name = to_ascii(raw.split(":", 1)[0])
+        if not name or not _HOST_RE.match(name):
+            return None
+        # endswith on the dotted suffix, notexample.com is not under example.com
+        if not name.endswith(self._suffix):
+            return None
+        return sys.intern(name)
+
+    def add(self, source: str, raw: str) -> bool:
+        """file one raw name under `source`, True when it is new to the scan."""
+        self.raw_counts[source] += 1
+        regular, wildcards = self.by_source.setdefault(source, (set(), set()))
+        if raw in self.regular:
+            regular.add(raw)
+            return False
+        if raw in self.wildcards:
+            wildcards.add(raw)
+            return False
+
+        name = self.normalize(raw)
+        if name is None:
+            self.rejected[source] += 1
+            return False
+        wildcard = name.startswith("*.")
+        (wildcards if wildcard else regular).add(name)
+        found = self.wildcards if wildcard else self.regular
+        if name in found:
+            return False
+        found.add(name)
+        self.discovered.append(name)
+        return True
+
+    def source_count(self, source: str) -> int:
+        regular, wildcards = self.by_source.get(source, ((), ()))
+        return len(regular) + len(wildcards)
+
+    def provenance(self) -> Dict[str, Dict[str, int]]:
+        return {source: {"raw": self.raw_counts[source], "distinct": self.source_count(source),
+                         "rejected": self.rejected[source]}
+                for source in self.raw_counts}
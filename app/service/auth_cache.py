@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import time
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+from cachetools import TLRUCache
+from sqlalchemy import event
+from app.core.core import app_setting
+from app.database.database import User
+
+
+def token_key(token: str) -> str:
+    # raw tokens never sit in memory as dict keys
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+@dataclass
+class _Principal:
+    user: User
+    expires_at: float
+
+
+class PrincipalCache:
+    """bounded token -> user cache shared by every request in a worker.
+
+    an entry lives for `ttl` seconds or until its token expires, whichever
+    comes first. entries are dropped per token on logout and per user when
+    the user row is updated or deleted. logged-out tokens are remembered
+    until they expire so they cannot be replayed against this worker.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.ttl = ttl
+        self._entries: TLRUCache = TLRUCache(maxsize=maxsize, ttu=lambda key, value, now: value.expires_at,
+                                             timer=time.time)
+        self._revoked: TLRUCache = TLRUCache(maxsize=maxsize, ttu=lambda key, value, now: value, timer=time.time)
+        self._by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            principal = self._entries.get(token_key(token))
+        return principal.user if principal else None
+
+    def set(self, token: str, user: User, token_expires_at: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        key = token_key(token)
+        with self._lock:
+            self._entries[key] = _Principal(user, expires_at)
+            # drop keys of this user's entries that have expired or been evicted meanwhile
+            keys = {k for k in self._by_user.get(user.id, ()) if k in self._entries}
+            keys.add(key)
+            self._by_user[user.id] = keys
+
+    def is_revoked(self, token: str) -> bool:
+        with self._lock:
+            return token_key(token) in self._revoked
+
+    def revoke(self, token: str, token_expires_at: Optional[float] = None):
+        key = token_key(token)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._revoked[key] = token_expires_at or time.time() + self.ttl
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in self._by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+
+_cache: Optional[PrincipalCache] = None
+
+
+def get_principal_cache() -> PrincipalCache:
+    global _cache
+    if _cache is None:
+        _cache = PrincipalCache(maxsize=app_setting.AUTH_CACHE_SIZE, ttl=app_setting.AUTH_CACHE_TTL)
+    return _cache
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User):
+    # role changes and deletions take effect on the next request, not after the ttl
+    get_principal_cache().invalidate_user(target.id)
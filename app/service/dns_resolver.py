@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import time
+import uuid
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+from cachetools import TLRUCache, TTLCache
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from app.core.core import app_setting
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=8)
+def load_wordlist(path: str) -> Tuple[str, ...]:
+    """read a wordlist file into a tuple of unique, lowercased labels.
+
+    blank lines and lines starting with '#' are ignored. results are cached per
+    path so large lists are only read from disk once per process.
+    """
+    labels: List[str] = []
+    seen: Set[str] = set()
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            label = line.strip().lower().rstrip(".")
+            if not label or label.startswith("#") or label in seen:
+                continue
+            seen.add(label)
+            labels.append(label)
+    logger.info(f"loaded {len(labels)} labels from wordlist {path}")
+    return tuple(labels)
+
+
+@dataclass(frozen=True)
+class HostRecord:
+    addresses: Tuple[str, ...]
+    cname: Optional[str]
+    ttl: int
+    resolved_at: datetime
+
+    @property
+    def live(self) -> bool:
+        return bool(self.addresses)
+
+
+@dataclass(frozen=True)
+class WildcardFingerprint:
+    """what random labels under `zone` resolve to.
+
+    `stable` means every probe resolved to the same answer, so no name in the
+    zone can be told apart from the wildcard by existence alone.
+    """
+    zone: str
+    addresses: FrozenSet[str]
+    cnames: FrozenSet[str]
+    stable: bool
+
+    def matches(self, addresses: Iterable[str], cname: Optional[str]) -> bool:
+        if cname and cname in self.cnames:
+            return True
+        addresses = set(addresses)
+        return bool(addresses) and addresses <= self.addresses
+
+
+def _addresses(answer: dns.resolver.Answer) -> Tuple[str, ...]:
+    return tuple(sorted(rdata.to_text() for rdata in answer.rrset))
+
+
+def _cname(answer: dns.resolver.Answer) -> Optional[str]:
+    if answer.canonical_name != answer.qname:
+        return answer.canonical_name.to_text().rstrip(".")
+    return None
+
+
+class DnsAnswerCache:
+    """positive and negative host answers, each kept for its record ttl.
+
+    positive ttls are clamped to [min_ttl, max_ttl] so a zero ttl does not
+    defeat the cache and a week-long one does not pin stale addresses, names
+    that do not exist are kept for `negative_ttl`.
+    """
+
+    def __init__(self, maxsize: int, min_ttl: int, max_ttl: int, negative_ttl: int):
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self._entries: TLRUCache = TLRUCache(maxsize=maxsize, ttu=lambda key, value, now: value[1], timer=time.time)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fqdn: str) -> Optional[HostRecord]:
+        entry = self._entries.get(fqdn)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def set(self, fqdn: str, record: HostRecord):
+        ttl = min(max(record.ttl, self.min_ttl), self.max_ttl) if record.live else self.negative_ttl
+        self._entries[fqdn] = (record, time.time() + ttl)
+
+
+class AsyncDnsResolver:
+    """non-blocking resolver with a process-wide cap on in-flight queries."""
+
+    def __init__(self, nameservers: Optional[List[str]] = None, concurrency: int = 200, timeout: float = 2.0,
+                 cache: Optional[DnsAnswerCache] = None, wildcard_probes: int = 3, wildcard_ttl: float = 3600):
+        self.resolver = dns.asyncresolver.Resolver(configure=not nameservers)
+        if nameservers:
+            self.resolver.nameservers = nameservers
+        self.resolver.timeout = timeout
+        self.resolver.lifetime = timeout
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.cache = cache
+        self.wildcard_probes = wildcard_probes
+        self._wildcards: TTLCache = TTLCache(maxsize=4096, ttl=wildcard_ttl)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(self, fqdn: str, rdtype: str = "A") -> Optional[dns.resolver.Answer]:
+        async with self._semaphore:
+            try:
+                return await self.resolver.resolve(fqdn, rdtype, lifetime=self.timeout)
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.NoNameservers):
+                return None
+            except dns.exception.Timeout:
+                logger.debug(f"DNS query timed out for: {fqdn}")
+                return None
+            except Exception as e:
+                logger.error(f"Error querying {fqdn}: {str(e)}")
+                return None
+
+    async def _answer(self, fqdn: str, rdtype: str) -> Tuple[str, Optional[dns.resolver.Answer]]:
+        # unlike resolve() this tells "does not exist" apart from "could not find out",
+        # only the former may be cached
+        async with self._semaphore:
+            try:
+                return "ok", await self.resolver.resolve(fqdn, rdtype, lifetime=self.timeout)
+            except dns.resolver.NXDOMAIN:
+                return "nxdomain", None
+            except dns.resolver.NoAnswer:
+                return "noanswer", None
+            except (dns.exception.Timeout, dns.resolver.NoNameservers):
+                return "error", None
+            except Exception as e:
+                logger.error(f"Error querying {fqdn}: {str(e)}")
+                return "error", None
+
+    async def lookup(self, fqdn: str) -> Optional[HostRecord]:
+        """A/AAAA (and CNAME) for one name, None when the servers gave no usable answer."""
+        if self.cache is not None:
+            cached = self.cache.get(fqdn)
+            if cached is not None:
+                return cached
+        (a_status, a), (aaaa_status, aaaa) = await asyncio.gather(
+            self._answer(fqdn, "A"), self._answer(fqdn, "AAAA"))
+        if a_status == "error" and aaaa_status == "error":
+            return None
+        answers = [answer for answer in (a, aaaa) if answer is not None]
+        addresses = tuple(sorted({address for answer in answers for address in _addresses(answer)}))
+        cname = None
+        for answer in answers:
+            cname = _cname(answer) or cname
+        if not answers and "nxdomain" not in (a_status, aaaa_status):
+            # the name exists but has no addresses, a dangling CNAME shows up here
+            cname_status, cname_answer = await self._answer(fqdn, "CNAME")
+            if cname_answer is not None:
+                cname = cname_answer.rrset[0].target.to_text().rstrip(".")
+        ttl = min((answer.rrset.ttl for answer in answers), default=0)
+        record = HostRecord(addresses=addresses, cname=cname, ttl=ttl, resolved_at=datetime.utcnow())
+        if self.cache is not None:
+            self.cache.set(fqdn, record)
+        return record
+
+    async def lookup_many(self, names: Iterable[str], into: Optional[Dict[str, HostRecord]] = None) -> Dict[str, HostRecord]:
+        """resolve every name with the shared concurrency cap. results are written to
+        `into` as they arrive so a caller can read partial results mid-way."""
+        records: Dict[str, HostRecord] = {} if into is None else into
+        pending = iter(names)
+
+        async def worker():
+            for fqdn in pending:
+                record = await self.lookup(fqdn)
+                if record is not None:
+                    records[fqdn] = record
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return records
+
+    async def wildcard(self, zone: str) -> Optional[WildcardFingerprint]:
+        """fingerprint the wildcard record of `zone`, None when it has none.
+
+        a few random labels are resolved, anything that answers for all of them
+        answers for every name. fingerprints are cached per zone.
+        """
+        if zone in self._wildcards:
+            return self._wildcards[zone]
+        probes = await asyncio.gather(*(self.resolve(f"{uuid.uuid4().hex[:12]}.{zone}")
+                                        for _ in range(self.wildcard_probes)))
+        answered = [answer for answer in probes if answer is not None]
+        fingerprint = None
+        if answered:
+            answer_sets = {(_addresses(answer), _cname(answer)) for answer in answered}
+            fingerprint = WildcardFingerprint(
+                zone=zone,
+                addresses=frozenset(address for addresses, _ in answer_sets for address in addresses),
+                cnames=frozenset(cname for _, cname in answer_sets if cname),
+                # round robin or geo answers vary per query, those zones still get brute forced
+                stable=len(answered) == len(probes) and len(answer_sets) == 1,
+            )
+        self._wildcards[zone] = fingerprint
+        return fingerprint
+
+    async def resolve_existing(self, names: Iterable[str],
+                               wildcards: Optional[Dict[str, Optional[WildcardFingerprint]]] = None) -> Set[str]:
+        """resolve every name and return the ones that exist.
+
+        a fixed number of workers pull from one shared iterator, so memory stays
+        flat however many names there are. hits that answer like the wildcard of
+        their parent zone in `wildcards` are dropped.
+        """
+        wildcards = wildcards or {}
+        found: Set[str] = set()
+        pending = iter(names)
+        dropped = 0
+
+        async def worker():
+            nonlocal dropped
+            for fqdn in pending:
+                answer = await self.resolve(fqdn)
+                if answer is None:
+                    continue
+                wildcard = wildcards.get(fqdn.split(".", 1)[-1])
+                if wildcard is not None and wildcard.matches(_addresses(answer), _cname(answer)):
+                    dropped += 1
+                    continue
+                found.add(fqdn)
+                logger.debug(f"Found subdomain: {fqdn}")
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        if dropped:
+            logger.info(f"dropped {dropped} wildcard answers")
+        return found
+
+    async def brute_force(self, domain: str, labels: Iterable[str],
+                          wildcard: Optional[WildcardFingerprint] = None) -> Set[str]:
+        """resolve `label.domain` for every label and return the names that exist."""
+        return await self.resolve_existing((f"{label}.{domain}" for label in labels), {domain: wildcard})
+
+
+_resolver: Optional[AsyncDnsResolver] = None
+
+
+def get_dns_resolver() -> AsyncDnsResolver:
+    global _resolver
+    if _resolver is None:
+        nameservers = [ns.strip() for ns in app_setting.DNS_NAMESERVERS.split(",") if ns.strip()]
+        _resolver = AsyncDnsResolver(
+            nameservers=nameservers,
+            concurrency=app_setting.DNS_CONCURRENCY,
+            timeout=app_setting.DNS_TIMEOUT,
+            cache=DnsAnswerCache(
+                maxsize=app_setting.DNS_CACHE_SIZE,
+                min_ttl=app_setting.DNS_CACHE_MIN_TTL,
+                max_ttl=app_setting.DNS_CACHE_MAX_TTL,
+                negative_ttl=app_setting.DNS_NEGATIVE_TTL,
+            ),
+            wildcard_probes=app_setting.DNS_WILDCARD_PROBES,
+            wildcard_ttl=app_setting.DNS_CACHE_MAX_TTL,
+        )
+    return _resolver
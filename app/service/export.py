@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+import logging
+import zlib
+
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.core import app_setting
+from app.database.database import AsyncReaderSessionLocal, User, Domain, SubDomain
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ("domain", "name", "first_seen", "last_seen", "seen_count", "is_live", "addresses", "cname",
+                 "resolved_at", "createdDate")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+async def get_export_domains(db: AsyncSession, user: Optional[User], domain_id: Optional[int] = None) -> List[Tuple[int, str]]:
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="oops, seems you are not authorized")
+    query = select(Domain.id, Domain.domain_name).where(Domain.user_id == user.id).order_by(Domain.id)
+    if domain_id is not None:
+        query = query.where(Domain.id == domain_id)
+    result = await db.execute(query)
+    domains = [(row.id, row.domain_name) for row in result.all()]
+    if domain_id is not None and not domains:
+        raise HTTPException(status_code=404, detail="Domain cannot be found")
+    return domains
+
+
+def export_filename(domains: List[Tuple[int, str]], fmt: str, compress: bool, single: bool) -> str:
+    stem = f"{domains[0][1]}-subdomains" if single else "subdomains"
+    return f"{stem}.{fmt}" + (".gz" if compress else "")
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_chunk(rows: Sequence[Sequence]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([[_value(value) for value in row] for row in rows])
+    return buffer.getvalue()
+
+
+def _ndjson_chunk(rows: Sequence[Sequence]) -> str:
+    return "".join(json.dumps(dict(zip(EXPORT_FIELDS, map(_value, row)))) + "\n" for row in rows)
+
+
+async def _partitions(db: AsyncSession, domain_id: int, domain_name: str, batch_size: int) -> AsyncIterator[Sequence]:
+    # one domain at a time in (domain_id, id) index order, so rows stream without a sort step
+    query = select(
+        SubDomain.name, SubDomain.first_seen, SubDomain.last_seen, SubDomain.seen_count, SubDomain.is_live,
+        SubDomain.addresses, SubDomain.cname, SubDomain.resolved_at, SubDomain.createdDate
+    ).where(SubDomain.domain_id == domain_id).order_by(SubDomain.id).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for partition in result.partitions():
+        yield [(domain_name, *row) for row in partition]
+
+
+async def stream_export(domains: List[Tuple[int, str]], fmt: str, compress: bool = False,
+                        batch_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """rows are read through a server-side cursor in batches and written out as
+    they arrive, memory stays at one batch however large the export is."""
+    batch_size = batch_size or app_setting.EXPORT_BATCH_SIZE
+    format_chunk = _csv_chunk if fmt == "csv" else _ndjson_chunk
+    # wbits=31 writes a gzip container rather than a raw zlib stream
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    exported = 0
+    if fmt == "csv":
+        yield encode(_csv_chunk([EXPORT_FIELDS]))
+    # the request session is gone once streaming starts, the export reads on its own
+    async with AsyncReaderSessionLocal() as db:
+        for domain_id, domain_name in domains:
+            async for rows in _partitions(db, domain_id, domain_name, batch_size):
+                exported += len(rows)
+                chunk = encode(format_chunk(rows))
+                if chunk:
+                    yield chunk
+    if compressor:
+        yield compressor.flush()
+    logger.info(f"exported {exported} subdomains across {len(domains)} domains as {fmt}")
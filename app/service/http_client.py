@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import httpx
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from app.core.core import app_setting
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HttpClientPool:
+    """one keep-alive connection pool shared by every enumerator source.
+
+    http/2 is negotiated through ALPN, so hosts that only speak http/1.1 fall
+    back transparently. on top of the global connection limits each host gets
+    its own cap on concurrent requests.
+    """
+
+    def __init__(self, max_connections: int, max_keepalive: int, keepalive_expiry: float,
+                 max_per_host: int, timeout: float, http2: bool):
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("h2 is not installed, falling back to http/1.1")
+            http2 = False
+        self.max_per_host = max_per_host
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).host
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return slot
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self._slot(url):
+            return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        async with self._slot(url):
+            async with self.client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_pool: Optional[HttpClientPool] = None
+
+
+def get_http_pool() -> HttpClientPool:
+    global _pool
+    if _pool is None:
+        _pool = HttpClientPool(
+            max_connections=app_setting.HTTP_MAX_CONNECTIONS,
+            max_keepalive=app_setting.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=app_setting.HTTP_KEEPALIVE_EXPIRY,
+            max_per_host=app_setting.HTTP_MAX_PER_HOST,
+            timeout=app_setting.HTTP_TIMEOUT,
+            http2=app_setting.HTTP_HTTP2,
+        )
+    return _pool
+
+
+async def close_http_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.aclose()
+        _pool = None
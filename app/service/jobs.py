@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.core import app_setting
+from app.database.database import AsyncSessionLocal, ScanJob, JobStatusEnum, User
+from app.service.search_enumerator import SubDomainScrapper, get_subdomain_data, get_updated_domains, normalize_domain
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ("search", "check-updates")
+# how long a finished job waits for its progress writer to flush before giving up on it
+PROGRESS_STOP_TIMEOUT = 5.0
+
+
+class ScanJobManager:
+    """runs submitted scans on a fixed number of background workers.
+
+    job rows are the source of truth: the queue only carries ids, a worker
+    claims a job by flipping it from queued to running, and queued jobs are
+    picked up again on start. a running job is held on a lease that its
+    process keeps renewing, so with several processes on one database only
+    jobs whose owner stopped heartbeating are requeued.
+    """
+
+    def __init__(self, workers: int, queue_size: int, lease: float):
+        self.workers = workers
+        self.lease = lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # queue slots promised to submissions that are still committing their rows
+        self._reserved = 0
+        self._tasks: List[asyncio.Task] = []
+        self._overflow: Set[asyncio.Task] = set()
+
+    async def start(self):
+        async with AsyncSessionLocal() as db:
+            # other processes may be running jobs right now, only expired leases were cut off
+            expired = datetime.utcnow() - timedelta(seconds=self.lease)
+            interrupted = await db.execute(update(ScanJob).where(
+                ScanJob.status == JobStatusEnum.running,
+                or_(ScanJob.heartbeat_at.is_(None), ScanJob.heartbeat_at < expired),
+            ).values(status=JobStatusEnum.queued, startedDate=None, worker_id=None, heartbeat_at=None))
+            await db.commit()
+            if interrupted.rowcount:
+                logger.info(f"requeued {interrupted.rowcount} scan jobs whose worker stopped heartbeating")
+            result = await db.execute(select(ScanJob.id).where(
+                ScanJob.status == JobStatusEnum.queued).order_by(ScanJob.createdDate))
+            pending = list(result.scalars().all())
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        # resumed jobs may outnumber the queue, they are fed in as workers free up slots
+        self._tasks.append(asyncio.create_task(self._resume(pending)))
+        logger.info(f"started {self.workers} scan workers, {len(pending)} queued jobs resumed")
+
+    async def stop(self):
+        tasks = [*self._tasks, *self._overflow]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _resume(self, pending: List[str]):
+        for job_id in pending:
+            await self._queue.put(job_id)
+
+    def _enqueue(self, job_id: str):
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            # only reachable while resumed jobs are still being fed in, wait for a slot
+            logger.warning(f"scan queue full, job {job_id} waits for a free slot")
+            task = asyncio.create_task(self._queue.put(job_id))
+            self._overflow.add(task)
+            task.add_done_callback(self._overflow.discard)
+
+    def _new_job(self, domain: str, kind: str, user: Optional[User], batch_id: Optional[str] = None) -> ScanJob:
+        return ScanJob(
+            id=uuid.uuid4().hex,
+            user_id=user.id if user else None,
+            domain=domain,
+            kind=kind,
+            batch_id=batch_id,
+            status=JobStatusEnum.queued,
+            progress={},
+        )
+
+    def _reserve(self, count: int):
+        # check and claim in one step with no await in between, so concurrent
+        # submissions cannot all pass the check and then overflow the queue
+        if self._queue.maxsize - self._queue.qsize() - self._reserved < count:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="scan queue is full, try again later")
+        self._reserved += count
+
+    async def submit(self, db: AsyncSession, domain: str, kind: str, user: Optional[User]) -> ScanJob:
+        if kind not in JOB_KINDS:
+            raise HTTPException(status_code=400, detail=f"unknown job kind {kind}")
+        if kind == "check-updates" and user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="oops, seems you are not authorized")
+        job = self._new_job(normalize_domain(domain), kind, user)
+        self._reserve(1)
+        try:
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+        finally:
+            self._reserved -= 1
+        self._enqueue(job.id)
+        logger.info(f"queued {kind} job {job.id} for {job.domain}")
+        return job
+
+    async def submit_batch(self, db: AsyncSession, domains: List[str], kind: str, user: Optional[User]) -> Tuple[str, List[ScanJob]]:
+        # one job per domain, all written in a single commit. the shared http pool, dns
+        # resolver and source slots cap what the batch sends upstream, not the batch size
+        if kind not in JOB_KINDS:
+            raise HTTPException(status_code=400, detail=f"unknown job kind {kind}")
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="oops, seems you are not authorized")
+        names = list(dict.fromkeys(normalize_domain(domain) for domain in domains if domain.strip()))
+        if not names:
+            raise HTTPException(status_code=400, detail="no domains to scan")
+        if len(names) > app_setting.BATCH_MAX_DOMAINS:
+            raise HTTPException(status_code=400,
+                                detail=f"a batch takes at most {app_setting.BATCH_MAX_DOMAINS} domains")
+        self._reserve(len(names))
+        batch_id = uuid.uuid4().hex
+        jobs = [self._new_job(name, kind, user, batch_id) for name in names]
+        try:
+            db.add_all(jobs)
+            await db.commit()
+        finally:
+            self._reserved -= len(names)
+        for job in jobs:
+            self._enqueue(job.id)
+        logger.info(f"queued batch {batch_id} of {len(jobs)} {kind} jobs")
+        return batch_id, jobs
+
+    async def _worker(self, number: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"scan worker {number} crashed on job {job_id}: {str(e)}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            claimed = await db.execute(update(ScanJob).where(
+                ScanJob.id == job_id, ScanJob.status == JobStatusEnum.queued
+            ).values(status=JobStatusEnum.running, startedDate=now, worker_id=self.worker_id, heartbeat_at=now))
+            await db.commit()
+            if not claimed.rowcount:
+                return
+            job = await db.get(ScanJob, job_id)
+            domain, kind = job.domain, job.kind
+            user = await db.get(User, job.user_id) if job.user_id else None
+            # hand the writer connection back while the scan runs, it is only needed to persist
+            await db.commit()
+
+            # listeners are synchronous, so progress is written by a separate task on
+            # its own session while the scan session is busy persisting results
+            progress = dict(job.progress or {})
+            changed = asyncio.Event()
+            stop = asyncio.Event()
+
+            def on_progress(source: str, source_status: str, scrapper: SubDomainScrapper):
+                progress[source] = {"status": source_status, "count": scrapper.source_count(source)}
+                changed.set()
+
+            writer = asyncio.create_task(self._write_progress(job_id, progress, changed, stop))
+            try:
+                if kind == "check-updates":
+                    result = await get_updated_domains(domain=domain, db=db, user=user, listener=on_progress)
+                else:
+                    result = await get_subdomain_data(domain, db, user, listener=on_progress)
+                job.result = result
+                job.status = JobStatusEnum.complete
+            except HTTPException as e:
+                await db.rollback()
+                job.status = JobStatusEnum.failed
+                job.error = str(e.detail)
+            except Exception as e:
+                await db.rollback()
+                job.status = JobStatusEnum.failed
+                job.error = str(e)
+            finally:
+                # let the writer finish its current write and flush once rather than
+                # cancelling it halfway through a commit on the shared writer connection
+                stop.set()
+                changed.set()
+                try:
+                    await asyncio.wait_for(writer, PROGRESS_STOP_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.warning(f"progress writer for job {job_id} did not stop in time")
+                except Exception as e:
+                    logger.error(f"progress writer for job {job_id} failed: {str(e)}")
+            job.progress = dict(progress)
+            job.finishedDate = datetime.utcnow()
+            await db.commit()
+            logger.info(f"job {job_id} for {domain} finished as {job.status.value}")
+
+    async def _write_progress(self, job_id: str, progress: dict, changed: asyncio.Event, stop: asyncio.Event):
+        # every write renews the lease, a scan with no news still writes once per interval
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(changed.wait(), self.lease / 3)
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(ScanJob).where(
+                    ScanJob.id == job_id, ScanJob.worker_id == self.worker_id
+                ).values(progress=dict(progress), heartbeat_at=datetime.utcnow()))
+                await db.commit()
+
+
+async def get_batch(db: AsyncSession, batch_id: str, user: Optional[User]) -> List[ScanJob]:
+    result = await db.execute(select(ScanJob).where(ScanJob.batch_id == batch_id).order_by(ScanJob.domain))
+    jobs = list(result.scalars().all())
+    if not jobs or user is None or any(job.user_id != user.id for job in jobs):
+        raise HTTPException(status_code=404, detail="Batch cannot be found")
+    return jobs
+
+
+def summarize_batch(batch_id: str, jobs: List[ScanJob]) -> Dict:
+    return {
+        "batch_id": batch_id,
+        "kind": jobs[0].kind if jobs else "search",
+        "total": len(jobs),
+        "statuses": dict(Counter(job.status.value for job in jobs)),
+        "jobs": jobs,
+    }
+
+
+async def get_job(db: AsyncSession, job_id: str, user: Optional[User]) -> ScanJob:
+    job = await db.get(ScanJob, job_id)
+    # jobs owned by a user are private, anonymous jobs are only reachable by their id
+    if job is None or (job.user_id is not None and (user is None or user.id != job.user_id)):
+        raise HTTPException(status_code=404, detail="Job cannot be found")
+    return job
+
+
+_manager: Optional[ScanJobManager] = None
+
+
+def get_job_manager() -> ScanJobManager:
+    global _manager
+    if _manager is None:
+        _manager = ScanJobManager(workers=app_setting.SCAN_WORKERS, queue_size=app_setting.SCAN_QUEUE_SIZE,
+                                  lease=app_setting.SCAN_JOB_LEASE)
+    return _manager
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import re
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Iterator, List, Optional, TypeVar
+from urllib.parse import urlparse
+from app.core.core import app_setting
+
+T = TypeVar("T")
+
+
+class JsonArrayStream:
+    """incremental parser for a top-level JSON array of objects.
+
+    text is fed in as it arrives and each complete item is yielded as soon as
+    its closing brace is seen. only the unparsed tail is buffered, so memory
+    is bounded by the largest single item rather than the whole document.
+    """
+
+    def __init__(self, max_item_size: int = 1024 * 1024):
+        self.max_item_size = max_item_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self._done = False
+
+    def feed(self, chunk: str) -> Iterator[Any]:
+        buf = self._buffer + chunk
+        pos, size = 0, len(buf)
+        while True:
+            while pos < size and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= size or self._done:
+                break
+            if not self._started:
+                if buf[pos] != "[":
+                    raise json.JSONDecodeError("expected a JSON array", buf, pos)
+                self._started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                self._done = True
+                pos += 1
+                break
+            try:
+                item, pos = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # the item is cut off at the end of this chunk
+                if size - pos > self.max_item_size:
+                    raise
+                break
+            yield item
+        self._buffer = buf[pos:]
+
+    def close(self):
+        # an empty body is not an empty array, it must fail like any other bad response
+        if not self._started:
+            raise json.JSONDecodeError("expected a JSON array", self._buffer, 0)
+        if not self._done:
+            raise json.JSONDecodeError("truncated JSON array", self._buffer, 0)
+
+
+# precompiled per-source extractors. they are plain module-level functions so
+# they can be shipped to a process pool as well as a thread pool.
+
+NETCRAFT_HOST_RE = re.compile(r'<a class="results-table__host" href="(.*?)"')
+DNSDUMPSTER_HOST_RE = re.compile(r'<td class="col-md-4">(.*?)<br>')
+CSRF_TOKEN_RE = re.compile(r'name="csrfmiddlewaretoken" value="(.*?)"')
+
+
+@lru_cache(maxsize=256)
+def search_engine_pattern(domain: str) -> re.Pattern:
+    return re.compile(r'(?<=//|\s)(\w+\.' + re.escape(domain) + ')')
+
+
+def extract_search_engine_hosts(text: str, domain: str) -> List[str]:
+    return search_engine_pattern(domain).findall(text)
+
+
+def extract_netcraft_hosts(text: str) -> List[str]:
+    return [urlparse(link).netloc for link in NETCRAFT_HOST_RE.findall(text)]
+
+
+def extract_dnsdumpster_hosts(text: str) -> List[str]:
+    return [host.strip() for host in DNSDUMPSTER_HOST_RE.findall(text)]
+
+
+_executor: Optional[Executor] = None
+
+
+def get_parse_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if app_setting.PARSE_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=app_setting.PARSE_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=app_setting.PARSE_WORKERS,
+                                           thread_name_prefix="parser")
+    return _executor
+
+
+def shutdown_parse_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def run_parser(extractor: Callable[..., T], text: str, *args) -> T:
+    # small bodies are cheaper to parse inline than to hand off
+    if len(text) < app_setting.PARSE_OFFLOAD_THRESHOLD:
+        return extractor(text, *args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_parse_executor(), extractor, text, *args)
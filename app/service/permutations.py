@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import logging
+import math
+import re
+
+from typing import Iterable, Iterator, List, Optional, Set
+from app.core.core import app_setting
+from app.service.dns_resolver import AsyncDnsResolver
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_RE = re.compile(r"\d+")
+
+
+class BloomFilter:
+    """fixed-size probabilistic set: no false negatives, false positives at
+    roughly `error_rate` once `capacity` items are in.
+
+    a name costs ~15 bits instead of a python string, so tens of thousands of
+    seeds and every candidate tried from them fit in a few hundred KiB.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # k positions from the two halves of one digest (double hashing)
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> bool:
+        """add `item`, False when it (probably) was there already."""
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                added = True
+        return added
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def _valid(name: str) -> bool:
+    return len(name) <= 253 and all(0 < len(label) <= 63 for label in name.split("."))
+
+
+def _split(name: str, domain: str):
+    if not name.endswith(f".{domain}") or name.startswith("*."):
+        return None
+    return name.partition(".")[::2]
+
+
+def candidates(names: List[str], domain: str, words: List[str]) -> Iterator[str]:
+    """candidate names derived from discovered names: number bumps
+    (api2 -> api1, api3), word joins (dev-api, api-dev) and one level down
+    (dev.api).
+
+    generated word by word across all names rather than name by name, so a
+    budget that runs out part way is spread over every seed.
+    """
+    for name in names:
+        parts = _split(name, domain)
+        if parts is None:
+            continue
+        first, parent = parts
+        for match in _NUMBER_RE.finditer(first):
+            value = int(match.group())
+            for bumped in (value - 1, value + 1):
+                if bumped >= 0:
+                    number = str(bumped).zfill(len(match.group()))
+                    yield f"{first[:match.start()]}{number}{first[match.end():]}.{parent}"
+    for word in words:
+        for name in names:
+            parts = _split(name, domain)
+            if parts is None or parts[0] == word:
+                continue
+            first, parent = parts
+            yield f"{word}-{first}.{parent}"
+            yield f"{first}-{word}.{parent}"
+            yield f"{word}.{name}"
+
+
+async def expand(domain: str, seeds: Iterable[str], resolver: AsyncDnsResolver,
+                 words: Optional[List[str]] = None, max_depth: Optional[int] = None,
+                 max_candidates: Optional[int] = None, error_rate: Optional[float] = None) -> Set[str]:
+    """resolve permutations of `seeds`, then of the names those turn up, up to
+    `max_depth` rounds and `max_candidates` dns queries in total, wildcard
+    probes included.
+
+    known and already tried names are kept in one bloom filter, so a name is
+    never generated twice and dedup memory does not grow with the seed set.
+    """
+    words = list(words or app_setting.PERMUTATION_WORDS)
+    max_depth = max_depth if max_depth is not None else app_setting.PERMUTATION_MAX_DEPTH
+    budget = max_candidates if max_candidates is not None else app_setting.PERMUTATION_MAX_CANDIDATES
+    seeds = [name for name in seeds if not name.startswith("*.")]
+
+    seen = BloomFilter(len(seeds) + budget, error_rate or app_setting.PERMUTATION_ERROR_RATE)
+    for name in seeds:
+        seen.add(name)
+
+    found: Set[str] = set()
+    frontier = seeds
+    for depth in range(1, max_depth + 1):
+        if not frontier or budget <= 0:
+            break
+        batch: List[str] = []
+        zones: Set[str] = set()
+        spent = 0
+        for candidate in candidates(frontier, domain, words):
+            # invalid and already tried names cost nothing, they must not end the depth
+            if not _valid(candidate) or candidate in seen:
+                continue
+            zone = candidate.split(".", 1)[1]
+            # the first candidate of a zone also pays for fingerprinting its wildcard
+            cost = 1 if zone in zones else 1 + resolver.wildcard_probes
+            if spent + cost > budget:
+                if spent >= budget:
+                    break
+                # too little left to fingerprint a new zone, names in known zones still fit
+                continue
+            seen.add(candidate)
+            batch.append(candidate)
+            zones.add(zone)
+            spent += cost
+        budget -= spent
+
+        ordered = sorted(zones)
+        fingerprints = await asyncio.gather(*(resolver.wildcard(zone) for zone in ordered))
+        wildcards = dict(zip(ordered, fingerprints))
+        if app_setting.DNS_WILDCARD_SKIP_STABLE:
+            # nothing under a fully wildcarded zone can be told apart from the wildcard
+            batch = [candidate for candidate in batch
+                     if not getattr(wildcards[candidate.split(".", 1)[1]], "stable", False)]
+
+        hits = await resolver.resolve_existing(batch, wildcards)
+        frontier = sorted(hits - found)
+        found |= hits
+        logger.info(f"permutation depth {depth} for {domain}: {len(batch)} candidates "
+                    f"across {len(zones)} zones, {len(hits)} resolved")
+    return found
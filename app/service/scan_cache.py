@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+from cachetools import LRUCache
+from app.core.core import app_setting
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    subdomains: Tuple[str, ...]
+    wildcards: Tuple[str, ...]
+    stored_at: float
+    stale: bool = False
+
+
+class ScanCache:
+    """per (source, domain) result cache: an in-process LRU in front of SQLite.
+
+    entries younger than the source ttl are fresh, entries within the extra
+    stale window are still served (flagged stale) so the caller can revalidate
+    in the background, anything older is a miss.
+    """
+
+    def __init__(self, path: str, maxsize: int, default_ttl: int, source_ttls: Dict[str, int], stale_ttl: int):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.source_ttls = source_ttls
+        self.stale_ttl = stale_ttl
+        self._memory: LRUCache = LRUCache(maxsize=maxsize)
+        self._memory_lock = threading.Lock()
+        self._local = threading.local()
+        self._setup()
+
+    def ttl_for(self, source: str) -> int:
+        return self.source_ttls.get(source, self.default_ttl)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _setup(self):
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS scan_cache ("
+            "source TEXT NOT NULL, domain TEXT NOT NULL, payload TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, PRIMARY KEY (source, domain))"
+        )
+        max_age = max([self.default_ttl, *self.source_ttls.values()]) + self.stale_ttl
+        conn.execute("DELETE FROM scan_cache WHERE stored_at < ?", (time.time() - max_age,))
+        conn.commit()
+
+    def _load(self, source: str, domain: str) -> Optional[CacheEntry]:
+        row = self._connection().execute(
+            "SELECT payload, stored_at FROM scan_cache WHERE source = ? AND domain = ?", (source, domain)
+        ).fetchone()
+        if row is None:
+            return None
+        payload = json.loads(row[0])
+        return CacheEntry(tuple(payload["subdomains"]), tuple(payload["wildcards"]), row[1])
+
+    def _store(self, source: str, domain: str, entry: CacheEntry):
+        payload = json.dumps({"subdomains": entry.subdomains, "wildcards": entry.wildcards})
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO scan_cache (source, domain, payload, stored_at) VALUES (?, ?, ?, ?)",
+            (source, domain, payload, entry.stored_at),
+        )
+        conn.commit()
+
+    def _classify(self, source: str, entry: Optional[CacheEntry]) -> Optional[CacheEntry]:
+        if entry is None:
+            return None
+        age = time.time() - entry.stored_at
+        ttl = self.ttl_for(source)
+        if age > ttl + self.stale_ttl:
+            return None
+        return CacheEntry(entry.subdomains, entry.wildcards, entry.stored_at, stale=age > ttl)
+
+    async def get(self, source: str, domain: str) -> Optional[CacheEntry]:
+        key = (source, domain)
+        with self._memory_lock:
+            entry = self._memory.get(key)
+        classified = self._classify(source, entry)
+        if classified is not None and not classified.stale:
+            return classified
+        # missing, stale or expired here, another worker may have stored a newer row
+        try:
+            stored = await asyncio.to_thread(self._load, source, domain)
+        except sqlite3.Error as e:
+            logger.error(f"scan cache read failed for {key}: {str(e)}")
+            return classified
+        if stored is not None and (entry is None or stored.stored_at > entry.stored_at):
+            entry = stored
+            with self._memory_lock:
+                self._memory[key] = entry
+        return self._classify(source, entry)
+
+    async def set(self, source: str, domain: str, subdomains: Iterable[str], wildcards: Iterable[str]):
+        key = (source, domain)
+        entry = CacheEntry(tuple(sorted(subdomains)), tuple(sorted(wildcards)), time.time())
+        with self._memory_lock:
+            self._memory[key] = entry
+        try:
+            await asyncio.to_thread(self._store, source, domain, entry)
+        except sqlite3.Error as e:
+            logger.error(f"scan cache write failed for {key}: {str(e)}")
+
+
+_scan_cache: Optional[ScanCache] = None
+
+
+def get_scan_cache() -> ScanCache:
+    global _scan_cache
+    if _scan_cache is None:
+        _scan_cache = ScanCache(
+            path=app_setting.SCAN_CACHE_PATH,
+            maxsize=app_setting.SCAN_CACHE_MEMORY_SIZE,
+            default_ttl=app_setting.SCAN_CACHE_TTL,
+            source_ttls=app_setting.SCAN_CACHE_SOURCE_TTLS,
+            stale_ttl=app_setting.SCAN_CACHE_STALE_TTL,
+        )
+    return _scan_cache
@@ -5,29 +5,205 @@ import random
 import logging
 import asyncio
 import json
-import dns.resolver
-import re
 
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, HTTPException, status
-from typing import List, Dict, Set
+from fastapi import FastAPI, Depends, HTTPException
+from typing import List, Dict, Set, Optional, Tuple, Iterable, Callable, AsyncIterator
 from urllib.parse import urlparse, quote_plus
-from app.database.database import get_database, User, Domain, SubDomain
-from sqlalchemy.orm import Session
+from app.core.core import app_setting
+from app.service.aggregator import ResultAggregator, to_ascii
+from app.database.database import AsyncSessionLocal, User, Domain, SubDomain
+from app.service.dns_resolver import HostRecord, get_dns_resolver, load_wordlist
+from app.service.http_client import get_http_pool
+from app.service.parsers import JsonArrayStream, CSRF_TOKEN_RE, run_parser, extract_search_engine_hosts, extract_netcraft_hosts, extract_dnsdumpster_hosts
+from app.service.permutations import expand as expand_permutations
+from app.service.sources import get_source_registry
+from app.service.scan_cache import get_scan_cache
+from sqlalchemy import Column, MetaData, String, Table, and_, bindparam, delete, func, insert, literal, select, true, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, before_sleep_log
-from cachetools import TTLCache
 
 logger = logging.getLogger(__name__)
 
 
-class SubDomainScrapper:
-    cache = TTLCache(maxsize=500, ttl=900)  # for 5 mins
+class SourceError(Exception):
+    pass
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get('Retry-After', ''))
+    except ValueError:
+        return None
+
+
+@dataclass
+class ScanResult:
+    domain: str
+    subdomains: Set[str]
+    wildcard_subdomains: Set[str]
+    discovered: List[str]
+    source_status: Dict[str, str]
+    partial: bool = False
+
+    @property
+    def failed_sources(self) -> List[str]:
+        # failed, timed out or skipped: whatever these found last time may still exist
+        return sorted(source for source, status in self.source_status.items() if status not in ('complete', 'cached'))
+
 
-    def __init__(self, domain: str):
+class SubDomainScrapper:
+    SOURCES = {
+        'search_engine': 'search_engine_enumerator',
+        'crt_sh': 'crt_sh_query',
+        'dns': 'dns_query',
+        'netcraft': 'netcraft_query',
+        'dns_dumpster': 'dns_dumpster_query',
+        'virustotal': 'virustotal_query',
+        'threatcrowd': 'threatcrowd_query',
+        'passivedns': 'passivedns_query',
+        'permutations': 'permutation_query',
+    }
+    # results that depend on what the other sources found in the same scan are not cached
+    UNCACHED_SOURCES = {'permutations'}
+    _revalidating: Set[Tuple[str, str]] = set()
+    _background_tasks: Set[asyncio.Task] = set()
+
+    def __init__(self, domain: str, wordlist: Optional[str] = None):
         self.domain = domain
-        self.subdomains: Set[str] = set()
-        self.session = httpx.AsyncClient()
-        self.wildcard_subdomains: Set[str] = set()
+        self.wordlist = wordlist or app_setting.DNS_WORDLIST
+        self.session = get_http_pool()
+        # every source feeds one aggregator, the attributes below are its live views
+        self.results = ResultAggregator(domain)
+        self.subdomains: Set[str] = self.results.regular
+        self.wildcard_subdomains: Set[str] = self.results.wildcards
+        self.source_results: Dict[str, Tuple[Set[str], Set[str]]] = self.results.by_source
+        self.discovered: List[str] = self.results.discovered
+        self.source_status: Dict[str, str] = {}
+        self._listeners: List[Callable[[str, str, 'SubDomainScrapper'], None]] = []
+
+    def add_listener(self, listener: Callable[[str, str, 'SubDomainScrapper'], None]):
+        self._listeners.append(listener)
+        # replay what already happened so late subscribers see the full picture
+        for source, status in list(self.source_status.items()):
+            listener(source, status, self)
+
+    def remove_listener(self, listener: Callable[[str, str, 'SubDomainScrapper'], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _set_status(self, source: str, status: str):
+        self.source_status[source] = status
+        for listener in list(self._listeners):
+            try:
+                listener(source, status, self)
+            except Exception as e:
+                logger.error(f"scan listener failed on {source} {status}: {str(e)}")
+
+    def timeout_for(self, source: str) -> float:
+        return app_setting.SOURCE_TIMEOUTS.get(source, app_setting.SOURCE_TIMEOUT)
+
+    def snapshot(self) -> ScanResult:
+        # sources still queued or running when the caller stops waiting are reported as timed out
+        pending = ('queued', 'running')
+        sources = {source: 'timed_out' if status in pending else status
+                   for source, status in self.source_status.items()}
+        return ScanResult(
+            domain=self.domain,
+            subdomains=set(self.subdomains),
+            wildcard_subdomains=set(self.wildcard_subdomains),
+            discovered=list(self.discovered),
+            source_status=sources,
+            partial=any(status in pending for status in self.source_status.values()),
+        )
+
+    def source_count(self, source: str) -> int:
+        return self.results.source_count(source)
+
+    async def _run_source(self, source: str):
+        self._set_status(source, 'running')
+        cache = get_scan_cache()
+        entry = None if source in self.UNCACHED_SOURCES else await cache.get(source, self.domain)
+        if entry is not None:
+            logger.info(f"using {'stale' if entry.stale else 'fresh'} cached {source} results for {self.domain}")
+            for subdomain in entry.subdomains + entry.wildcards:
+                self.results.add(source, subdomain)
+            if entry.stale:
+                self._schedule_revalidation(source)
+            self._set_status(source, 'cached')
+            return
+
+        registry = get_source_registry()
+        if not registry.allow(source):
+            logger.info(f"skipping {source} for {self.domain}, circuit is open")
+            self._set_status(source, 'skipped')
+            return
+
+        if registry.busy(source):
+            self._set_status(source, 'queued')
+        # each source gets its own budget once it has a slot, wait_for cancels it once that is spent
+        try:
+            async with registry.slot(source):
+                if self.source_status.get(source) == 'queued':
+                    self._set_status(source, 'running')
+                await asyncio.wait_for(getattr(self, self.SOURCES[source])(), timeout=self.timeout_for(source))
+        except asyncio.TimeoutError:
+            logger.warning(f"{source} query for {self.domain} timed out")
+            registry.record(source, ok=False)
+            self._set_status(source, 'timed_out')
+            return
+        except Exception as e:
+            logger.error(f"{source} query for {self.domain} failed: {str(e)}")
+            registry.record(source, ok=False)
+            self._set_status(source, 'failed')
+            return
+        registry.record(source, ok=True)
+        if source not in self.UNCACHED_SOURCES:
+            regular, wildcards = self.source_results.get(source, (set(), set()))
+            await cache.set(source, self.domain, regular, wildcards)
+        self._set_status(source, 'complete')
+
+    def _schedule_revalidation(self, source: str):
+        key = (source, self.domain)
+        if key in self._revalidating:
+            return
+        self._revalidating.add(key)
+        task = asyncio.create_task(self._revalidate(source, self.domain))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    @classmethod
+    async def _revalidate(cls, source: str, domain: str):
+        scrapper = cls(domain)
+        registry = get_source_registry()
+        try:
+            if not registry.allow(source):
+                return
+            async with registry.slot(source):
+                await asyncio.wait_for(getattr(scrapper, cls.SOURCES[source])(), timeout=scrapper.timeout_for(source))
+            registry.record(source, ok=True)
+            regular, wildcards = scrapper.source_results.get(source, (set(), set()))
+            await get_scan_cache().set(source, domain, regular, wildcards)
+            logger.info(f"revalidated cached {source} results for {domain}")
+        except Exception as e:
+            registry.record(source, ok=False)
+            logger.error(f"Error revalidating {source} results for {domain}: {str(e)}")
+        finally:
+            cls._revalidating.discard((source, domain))
+
+    async def _request(self, source: str, method: str, url: str, **kwargs) -> httpx.Response:
+        registry = get_source_registry()
+        await registry.acquire(source)
+        response = await self.session.request(method, url, **kwargs)
+        if response.status_code == 429:
+            registry.throttled(source, _retry_after(response))
+            raise SourceError(f"{source} rate limited the request")
+        return response
 
     def getHeaders(self):
         return {
@@ -56,20 +232,16 @@ class SubDomainScrapper:
 
                 try:
                     logger.debug(f"Querying {search_engine} with URL: {url}")
-                    response = await self.session.get(url, headers=self.getHeaders())
+                    response = await self._request('search_engine', 'GET', url, headers=self.getHeaders())
 
                     if response.status_code != 200:
                         logger.warning(f"Unexpected status code {
                                        response.status_code} from {search_engine}")
                         break
-                    subdomains = re.findall(
-                        r'(?<=//|\s)(\w+\.' + re.escape(self.domain) + ')', response.text)
+                    subdomains = await run_parser(extract_search_engine_hosts, response.text, self.domain)
 
                     for subdomain in subdomains:
-                        if subdomain.startswith('*.'):
-                            self.wildcard_subdomains.add(subdomain)
-                        else:
-                            self.subdomains.add(subdomain)
+                        self.results.add('search_engine', subdomain)
                     logger.info(f"Found {len(subdomains)} subdomains from {
                                 search_engine} on page {page_no}")
                     page_no += 10 if search_engine in ['google',
@@ -91,134 +263,93 @@ class SubDomainScrapper:
     @retry(
         stop=stop_after_attempt(6),
         wait=wait_exponential(multiplier=1, min=4, max=60),
-        retry=retry_if_exception_type(
-            (httpx.HTTPError, status.HTTP_503_SERVICE_UNAVAILABLE, json.JSONDecodeError)),
-        before_sleep=before_sleep_log(logger=logger, log_level=logger.info),
+        retry=retry_if_exception_type((httpx.HTTPError, json.JSONDecodeError)),
+        before_sleep=before_sleep_log(logger=logger, log_level=logging.INFO),
         reraise=True
     )
     async def crt_sh_query(self):
-        if self.domain in self.cache:
-            logger.info(f"using cache results found for {self.domain}")
-            c_data = self.cache[self.domain]
-            self.subdomains = c_data['subdomains']
-            self.wildcard_subdomains = c_data['wildcard_subdomains']
-            return
-
         url = f"https://crt.sh/?q=%.{self.domain}&output=json"
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url)
+            registry = get_source_registry()
+            await registry.acquire('crt_sh')
+            # parse entries as they arrive instead of holding the whole body in memory
+            async with self.session.stream('GET', url) as response:
+                if response.status_code == 429:
+                    registry.throttled('crt_sh', _retry_after(response))
+                    raise SourceError("crt.sh rate limited the request")
                 response.raise_for_status()
-                data = response.json()
-
-                for entry in data:
-                    name_value = entry.get('name_value', '')
-                    parts = name_value.split('\n')
-                    for part in parts:
-                        part = part.strip()
-                        if part.endswith(self.domain) and part != self.domain:
-                            if part.startswith('*.'):
-                                self.wildcard_subdomains.add(part)
-                            else:
-                                self.subdomains.add(part)
-            self.cache[self.domain] = {
-                'subdomains': self.subdomains,
-                'wildcard_subdomains': self.wildcard_subdomains
-            }
+                parser = JsonArrayStream()
+                async for chunk in response.aiter_text():
+                    for entry in parser.feed(chunk):
+                        name_value = entry.get('name_value', '')
+                        for part in name_value.split('\n'):
+                            self.results.add('crt_sh', part)
+                parser.close()
         except json.JSONDecodeError:
-            print("Error: Invalid JSON response from crt.sh")
+            logger.error("Error: Invalid JSON response from crt.sh")
+            raise
         except Exception as e:
-            print(e)
-            print(f"Error fetching from crt.sh query: {str(e)}")
+            logger.error(f"Error fetching from crt.sh query: {str(e)}")
+            raise
 
     async def dns_query(self):
-        resolver = dns.resolver.Resolver()
-        resolver.nameservers = ['8.8.8.8', '8.8.4.4']
-
-        # Attempt wildcard query
-        try:
-            wildcard_results = resolver.resolve(f"*.{self.domain}", 'A')
-            self.wildcard_subdomains.add(f"*.{self.domain}")
-            logger.info(f"Wildcard DNS entry found for {self.domain}")
-        except dns.resolver.NXDOMAIN:
+        resolver = get_dns_resolver()
+
+        # Fingerprint the wildcard record with random labels
+        wildcard = await resolver.wildcard(self.domain)
+        if wildcard is not None:
+            self.results.add('dns', f"*.{self.domain}")
+            logger.info(f"Wildcard DNS entry found for {self.domain}, stable={wildcard.stable}")
+            if wildcard.stable and app_setting.DNS_WILDCARD_SKIP_STABLE:
+                # every guess would resolve to the wildcard, brute forcing only finds noise
+                logger.info(f"Skipping brute force of fully wildcarded {self.domain}")
+                return
+        else:
             logger.info(f"No wildcard DNS entry for {self.domain}")
-        except dns.resolver.NoAnswer:
-            logger.info(f"No answer for wildcard DNS query for {self.domain}")
-        except Exception as e:
-            logger.error(f"Error in wildcard DNS query for {
-                         self.domain}: {str(e)}")
-
-        # Query common subdomains
-        common_subdomains = [
-            'www', 'mail', 'ftp', 'localhost', 'webmail', 'smtp', 'pop', 'ns1',
-            'webdisk', 'ns2', 'cpanel', 'whm', 'autodiscover', 'autoconfig', 'm',
-            'imap', 'test', 'ns', 'blog', 'pop3', 'dev', 'www2', 'admin', 'forum',
-            'news', 'vpn', 'ns3', 'mail2', 'new', 'mysql', 'old', 'lists', 'support',
-            'mobile', 'mx', 'static', 'docs', 'beta', 'shop', 'sql', 'secure', 'demo',
-            'cp', 'calendar', 'wiki', 'web', 'media', 'email', 'images',
-            'img', 'www1', 'intranet', 'portal', 'video', 'sip', 'dns2', 'api', 'cdn',
-            'stats', 'dns1', 'ns4', 'www3', 'dns', 'search', 'staging', 'server', 'mx1',
-            'chat', 'wap', 'my', 'svn', 'mail1', 'sites', 'proxy', 'ads', 'host', 'crm',
-            'cms', 'backup', 'mx2', 'lyncdiscover', 'info', 'apps', 'download', 'remote',
-            'db', 'forums', 'store', 'relay', 'files', 'newsletter', 'app', 'live', 'owa',
-            'en', 'start', 'sms', 'office', 'exchange', 'ipv4'
-        ]
 
-        for subdomain in common_subdomains:
-            try:
-                fqdn = f"{subdomain}.{self.domain}"
-                results = resolver.resolve(fqdn, 'A')
-                self.subdomains.add(fqdn)
-                logger.info(f"Found subdomain: {fqdn}")
-            except dns.resolver.NXDOMAIN:
-                logger.debug(f"Subdomain does not exist: {fqdn}")
-            except dns.resolver.NoAnswer:
-                logger.debug(f"No DNS records for: {fqdn}")
-            except dns.resolver.Timeout:
-                logger.warning(f"DNS query timed out for: {fqdn}")
-            except Exception as e:
-                logger.error(f"Error querying {fqdn}: {str(e)}")
+        # Brute force labels from the configured wordlist
+        labels = load_wordlist(self.wordlist)
+        found = await resolver.brute_force(self.domain, labels, wildcard=wildcard)
+        for fqdn in found:
+            self.results.add('dns', fqdn)
 
-        logger.info(f"DNS query completed for {self.domain}. Found {
-                    len(self.subdomains)} subdomains.")
+        logger.info(f"DNS query completed for {self.domain}. Tried {len(labels)} labels, found {len(found)} subdomains.")
+
+    async def permutation_query(self):
+        seeds = sorted(self.subdomains)
+        found = await expand_permutations(self.domain, seeds, get_dns_resolver())
+        for fqdn in found:
+            self.results.add('permutations', fqdn)
+        logger.info(f"Permutations of {len(seeds)} names for {self.domain} found {len(found)} new subdomains.")
 
     async def netcraft_query(self):
         url = f'https://searchdns.netcraft.com/?restriction=site+ends+with&host={
             self.domain}'
         try:
-            response = await self.session.get(url, headers=self.getHeaders())
-            links = re.findall(
-                '<a class="results-table__host" href="(.*?)"', response.text)
-            for link in links:
-                subdomain = urlparse(link).netloc
-                if subdomain.endswith(self.domain) and subdomain != self.domain:
-                    if subdomain.startswith('*.'):
-                        self.wildcard_subdomains.add(subdomain)
-                    else:
-                        self.subdomains.add(subdomain)
+            response = await self._request('netcraft', 'GET', url, headers=self.getHeaders())
+            for subdomain in await run_parser(extract_netcraft_hosts, response.text):
+                self.results.add('netcraft', subdomain)
         except httpx.RequestError as e:
-            print(f"HTTP Request Error in Netcraft query: {str(e)}")
+            logger.error(f"HTTP Request Error in Netcraft query: {str(e)}")
+            raise
         except Exception as e:
-            print(f"Unexpected error in Netcraft query: {str(e)}")
+            logger.error(f"Unexpected error in Netcraft query: {str(e)}")
+            raise
 
     async def dns_dumpster_query(self):
         url = 'https://dnsdumpster.com/'
         try:
             logger.debug(f"Sending initial GET request to DNS Dumpster: {url}")
-            response = await self.session.get(url, headers=self.getHeaders())
+            response = await self._request('dns_dumpster', 'GET', url, headers=self.getHeaders())
 
             logger.debug(f"Initial response status code: {
                          response.status_code}")
             if response.status_code != 200:
-                logger.error(f"Unexpected status code in initial request: {
-                             response.status_code}")
-                return
+                raise SourceError(f"Unexpected status code in initial request: {response.status_code}")
 
-            csrf_token_match = re.search(
-                r'name="csrfmiddlewaretoken" value="(.*?)"', response.text)
+            csrf_token_match = CSRF_TOKEN_RE.search(response.text)
             if not csrf_token_match:
-                logger.error("CSRF token not found in the response")
-                return
+                raise SourceError("CSRF token not found in the response")
 
             csrf_token = csrf_token_match.group(1)
             logger.debug(f"CSRF token found: {csrf_token}")
@@ -234,25 +365,17 @@ class SubDomainScrapper:
 
             logger.debug(
                 f"Sending POST request to DNS Dumpster with data: {data}")
-            response = await self.session.post(url, headers=headers, cookies=cookie_data, data=data)
+            response = await self._request('dns_dumpster', 'POST', url, headers=headers, cookies=cookie_data, data=data)
 
             logger.debug(f"POST response status code: {response.status_code}")
             if response.status_code != 200:
-                logger.error(f"Unexpected status code in POST request: {
-                             response.status_code}")
-                return
+                raise SourceError(f"Unexpected status code in POST request: {response.status_code}")
 
-            subdomains = re.findall(
-                r'<td class="col-md-4">(.*?)<br>', response.text)
+            subdomains = await run_parser(extract_dnsdumpster_hosts, response.text)
             logger.info(f"Total subdomains found: {len(subdomains)}")
 
             for subdomain in subdomains:
-                subdomain = subdomain.strip()
-                if subdomain.endswith(self.domain) and subdomain != self.domain:
-                    if subdomain.startswith('*.'):
-                        self.wildcard_subdomains.add(subdomain)
-                    else:
-                        self.subdomains.add(subdomain)
+                self.results.add('dns_dumpster', subdomain)
 
             logger.info(f"Regular subdomains found: {len(self.subdomains)}")
             logger.info(f"Wildcard subdomains found: {
@@ -260,192 +383,420 @@ class SubDomainScrapper:
 
         except httpx.RequestError as e:
             logger.error(f"HTTP Request Error in DNS Dumpster query: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Unexpected error in DNS Dumpster query: {str(e)}")
+            raise
 
     async def virustotal_query(self):
         url = f'https://www.virustotal.com/ui/domains/{self.domain}/subdomains'
         try:
             logger.debug(f"Sending request to VirusTotal: {url}")
-            response = await self.session.get(url, headers=self.getHeaders())
+            response = await self._request('virustotal', 'GET', url, headers=self.getHeaders())
 
             logger.debug(f"VirusTotal response status code: {
                          response.status_code}")
             if response.status_code != 200:
-                logger.error(f"Unexpected status code from VirusTotal: {
-                             response.status_code}")
-                return
+                raise SourceError(f"Unexpected status code from VirusTotal: {response.status_code}")
 
             data = response.json()
             for item in data.get('data', []):
                 if item['type'] == 'domain':
-                    subdomain = item['id']
-                    if subdomain.endswith(self.domain) and subdomain != self.domain:
-                        if subdomain.startswith('*.'):
-                            self.wildcard_subdomains.add(subdomain)
-                        else:
-                            self.subdomains.add(subdomain)
+                    self.results.add('virustotal', item['id'])
 
             logger.info(f"VirusTotal query found {len(self.subdomains)} regular subdomains and {
                         len(self.wildcard_subdomains)} wildcard subdomains")
 
         except httpx.RequestError as e:
             logger.error(f"HTTP Request Error in VirusTotal query: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Unexpected error in VirusTotal query: {str(e)}")
+            raise
 
     async def threatcrowd_query(self):
         url = f'https://www.threatcrowd.org/searchApi/v2/domain/report/?domain={
             self.domain}'
         try:
             logger.debug(f"Sending request to ThreatCrowd: {url}")
-            response = await self.session.get(url, headers=self.getHeaders())
+            response = await self._request('threatcrowd', 'GET', url, headers=self.getHeaders())
 
             logger.debug(f"ThreatCrowd response status code: {
                          response.status_code}")
             if response.status_code != 200:
-                logger.error(f"Unexpected status code from ThreatCrowd: {
-                             response.status_code}")
-                return
+                raise SourceError(f"Unexpected status code from ThreatCrowd: {response.status_code}")
 
             data = response.json()
             for subdomain in data.get('subdomains', []):
-                if subdomain.endswith(self.domain) and subdomain != self.domain:
-                    if subdomain.startswith('*.'):
-                        self.wildcard_subdomains.add(subdomain)
-                    else:
-                        self.subdomains.add(subdomain)
+                self.results.add('threatcrowd', subdomain)
 
             logger.info(f"ThreatCrowd query found {len(self.subdomains)} regular subdomains and {
                         len(self.wildcard_subdomains)} wildcard subdomains")
 
         except httpx.RequestError as e:
             logger.error(f"HTTP Request Error in ThreatCrowd query: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Unexpected error in ThreatCrowd query: {str(e)}")
+            raise
 
     async def passivedns_query(self):
         url = f'https://api.sublist3r.com/search.php?domain={self.domain}'
         try:
             logger.debug(f"Sending request to PassiveDNS: {url}")
-            response = await self.session.get(url, headers=self.getHeaders())
+            response = await self._request('passivedns', 'GET', url, headers=self.getHeaders())
 
             logger.debug(f"PassiveDNS response status code: {
                          response.status_code}")
             if response.status_code != 200:
-                logger.error(f"Unexpected status code from PassiveDNS: {
-                             response.status_code}")
-                return
+                raise SourceError(f"Unexpected status code from PassiveDNS: {response.status_code}")
 
             subdomains = response.json()
             for subdomain in subdomains:
-                if subdomain.endswith(self.domain) and subdomain != self.domain:
-                    if subdomain.startswith('*.'):
-                        self.wildcard_subdomains.add(subdomain)
-                    else:
-                        self.subdomains.add(subdomain)
+                self.results.add('passivedns', subdomain)
 
             logger.info(f"PassiveDNS query found {len(self.subdomains)} regular subdomains and {
                         len(self.wildcard_subdomains)} wildcard subdomains")
 
         except httpx.RequestError as e:
             logger.error(f"HTTP Request Error in PassiveDNS query: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Unexpected error in PassiveDNS query: {str(e)}")
+            raise
 
     def get_all_subdomains(self) -> List[str]:
         return sorted(list(self.subdomains.union(self.wildcard_subdomains)))
 
     async def run_all_query_async(self):
         tasks = [
-            # self.search_engine_enumerator(),
-            self.crt_sh_query(),
-            self.dns_query(),
-            self.netcraft_query(),
-            self.dns_dumpster_query(),
+            # self._run_source('search_engine'),
+            self._run_source('crt_sh'),
+            self._run_source('dns'),
+            self._run_source('netcraft'),
+            self._run_source('dns_dumpster'),
         ]
         await asyncio.gather(*tasks)
-        await self.session.aclose()
+        if app_setting.PERMUTATIONS_ENABLED:
+            # seeded by everything the sources above found
+            await self._run_source('permutations')
+        logger.info(f"aggregated results for {self.domain}: {self.results.provenance()}")
         return list(self.subdomains)
 
 
-async def get_subdomain_data(domain: str, db: Session, user: User) -> Dict[str, List[str]]:
+_inflight: Dict[str, Tuple[SubDomainScrapper, asyncio.Task]] = {}
+
+
+def normalize_domain(domain: str) -> str:
+    netloc = urlparse(f"http://{domain.strip()}").netloc
+    return to_ascii(netloc) or netloc.lower().rstrip('.')
+
+
+def reverse_labels(name: str) -> str:
+    # dev.corp.example.com -> com.example.corp.dev. the trailing dot keeps
+    # prefix matches on label boundaries
+    return '.'.join(reversed(name.lower().rstrip('.').split('.'))) + '.'
+
+
+async def enumerate_domain(domain: str, listener: Optional[Callable[[str, str, SubDomainScrapper], None]] = None,
+                           deadline: Optional[float] = None) -> ScanResult:
+    # concurrent callers for the same domain share one running enumeration
+    entry = _inflight.get(domain)
+    if entry is None:
+        res = SubDomainScrapper(domain)
+        task = asyncio.create_task(res.run_all_query_async())
+        entry = _inflight[domain] = (res, task)
+        task.add_done_callback(
+            lambda t: _inflight.pop(domain, None) if _inflight.get(domain, (None, None))[1] is t else None)
+    else:
+        logger.info(f"joining in-flight enumeration for {domain}")
+    res, task = entry
+    if listener:
+        res.add_listener(listener)
     try:
-        parsed_domain = urlparse(f"http://{domain}").netloc
-        res = SubDomainScrapper(parsed_domain)
-        data = await res.run_all_query_async()
+        # shield so one caller disconnecting or hitting its deadline does not cancel
+        # the scan, slow sources keep running and fill the cache in the background
+        await asyncio.wait_for(asyncio.shield(task), deadline)
+    except asyncio.TimeoutError:
+        logger.info(f"deadline of {deadline}s reached for {domain}, returning partial results")
+    finally:
+        if listener:
+            res.remove_listener(listener)
+    return res.snapshot()
+
+
+async def get_or_create_domain(db: AsyncSession, domain_name: str, user_id: int) -> Domain:
+    query = select(Domain).where(Domain.domain_name == domain_name, Domain.user_id == user_id)
+    domain = await db.scalar(query)
+    if not domain:
+        # concurrent scans of the same domain can race here, the unique index decides the winner
+        await db.execute(_insert_ignore(db, Domain).values(domain_name=domain_name, user_id=user_id))
+        domain = await db.scalar(query)
+    return domain
+
+
+def _insert_ignore(db: AsyncSession, model):
+    dialect = db.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite_insert(model).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql_insert(model).on_conflict_do_nothing()
+    return insert(model).prefix_with('IGNORE')
+
+
+# per-connection staging table for the names of one scan, the diff against
+# stored rows is done with joins instead of loading history into python
+scan_stage = Table('scan_stage', MetaData(), Column('name', String, primary_key=True),
+                   Column('reversed_name', String), prefixes=['TEMPORARY'])
+
+
+@dataclass
+class SubdomainDiff:
+    new: List[str]
+    removed: List[str]
+
+
+# sqlite before 3.32 binds at most 999 parameters per statement
+SQLITE_MAX_VARIABLES = 999
+
+
+async def _stage_names(db: AsyncSession, names: List[str], chunk_size: int):
+    # ddl compiled from the table, so column types match the dialect
+    await db.execute(CreateTable(scan_stage, if_not_exists=True))
+    await db.execute(delete(scan_stage))
+    # every staged row binds one parameter per column
+    chunk_size = min(chunk_size, SQLITE_MAX_VARIABLES // len(scan_stage.columns))
+    for i in range(0, len(names), chunk_size):
+        await db.execute(insert(scan_stage).values([{'name': name, 'reversed_name': reverse_labels(name)}
+                                                    for name in names[i:i + chunk_size]]))
+
+
+def _upsert_seen(db: AsyncSession, domain_id: int, seen_at: datetime):
+    # every staged name is inserted, names already stored get last_seen/seen_count bumped
+    rows = select(literal(domain_id), scan_stage.c.name, scan_stage.c.reversed_name, literal(seen_at),
+                  literal(seen_at), literal(seen_at), literal(1)).where(true())
+    columns = ['domain_id', 'name', 'reversed_name', 'createdDate', 'first_seen', 'last_seen', 'seen_count']
+    dialect = db.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite_insert if dialect == 'sqlite' else postgresql_insert)(SubDomain).from_select(columns, rows)
+        return stmt.on_conflict_do_update(index_elements=['domain_id', 'name'], set_={
+            'last_seen': stmt.excluded.last_seen,
+            'seen_count': SubDomain.seen_count + 1,
+        })
+    stmt = mysql_insert(SubDomain).from_select(columns, rows)
+    return stmt.on_duplicate_key_update(last_seen=stmt.inserted.last_seen, seen_count=SubDomain.seen_count + 1)
+
+
+async def persist_subdomains(db: AsyncSession, domain_id: int, names: Iterable[str],
+                             chunk_size: Optional[int] = None, seen_at: Optional[datetime] = None) -> SubdomainDiff:
+    chunk_size = chunk_size or app_setting.DB_INSERT_CHUNK_SIZE
+    seen_at = seen_at or datetime.utcnow()
+    names = sorted(set(names))
+    await _stage_names(db, names, chunk_size)
+
+    # every name of the previous scan shares one last_seen, so this is an index seek on (domain_id, last_seen)
+    previous_scan = await db.scalar(select(func.max(SubDomain.last_seen)).where(SubDomain.domain_id == domain_id))
+    await db.execute(_upsert_seen(db, domain_id, seen_at))
+
+    # first_seen is only written on insert, so these are the rows this upsert created. a
+    # concurrent scan that inserted a name first keeps its own first_seen and counts it
+    result = await db.execute(select(scan_stage.c.name).join(SubDomain, and_(
+        SubDomain.domain_id == domain_id, SubDomain.name == scan_stage.c.name,
+    )).where(SubDomain.first_seen == seen_at).order_by(scan_stage.c.name))
+    new = list(result.scalars().all())
+    if new:
+        # incremented in the database, a read-modify-write would lose concurrent scans' counts
+        await db.execute(update(Domain).where(Domain.id == domain_id).values(
+            sub_domain_count=Domain.sub_domain_count + len(new)))
+
+    removed = []
+    if previous_scan is not None:
+        # rows seen last time and not refreshed by this scan
+        result = await db.execute(select(SubDomain.name).where(
+            SubDomain.domain_id == domain_id,
+            SubDomain.last_seen >= previous_scan,
+            SubDomain.last_seen < seen_at).order_by(SubDomain.name))
+        removed = list(result.scalars().all())
+    await db.execute(delete(scan_stage))
+    logger.info(f"persisted {len(new)} new of {len(names)} subdomains for domain {domain_id}, {len(removed)} gone")
+    return SubdomainDiff(new=new, removed=removed)
+
+
+_enrichment_tasks: Set[asyncio.Task] = set()
+
+
+def _enrichment_row(name: str, record: HostRecord) -> Dict:
+    return {'b_name': name, 'b_is_live': record.live, 'b_addresses': ','.join(record.addresses) or None,
+            'b_cname': record.cname, 'b_resolved_at': record.resolved_at}
+
+
+async def enrich_subdomains(domain_id: int, names: Iterable[str], chunk_size: Optional[int] = None):
+    """resolve stored names and write the answers onto their rows.
+
+    an answer that matches the wildcard of the name's parent zone says nothing
+    about the name, it is left unresolved rather than marked live.
+    """
+    chunk_size = chunk_size or app_setting.DB_INSERT_CHUNK_SIZE
+    names = sorted(name for name in set(names) if not name.startswith('*.'))
+    resolver = get_dns_resolver()
+    zones = sorted({name.split('.', 1)[1] for name in names})
+    wildcards = dict(zip(zones, await asyncio.gather(*(resolver.wildcard(zone) for zone in zones))))
+    records = await resolver.lookup_many(names)
+
+    rows, wildcarded = [], 0
+    for name, record in records.items():
+        wildcard = wildcards.get(name.split('.', 1)[1])
+        if record.live and wildcard is not None and wildcard.matches(record.addresses, record.cname):
+            wildcarded += 1
+            continue
+        rows.append(_enrichment_row(name, record))
+
+    stmt = update(SubDomain.__table__).where(
+        SubDomain.domain_id == domain_id, SubDomain.name == bindparam('b_name')
+    ).values(is_live=bindparam('b_is_live'), addresses=bindparam('b_addresses'),
+             cname=bindparam('b_cname'), resolved_at=bindparam('b_resolved_at'))
+    # one short transaction per chunk, so scans waiting on the writer are not held up
+    for i in range(0, len(rows), chunk_size):
+        async with AsyncSessionLocal() as db:
+            await db.execute(stmt, rows[i:i + chunk_size])
+            await db.commit()
+    live = sum(1 for row in rows if row['b_is_live'])
+    logger.info(f"resolved {len(records)} of {len(names)} subdomains for domain {domain_id}, "
+                f"{live} live, {wildcarded} only answered by a wildcard")
+
+
+def schedule_enrichment(domain_id: int, names: Iterable[str]):
+    # dns answers are not part of the scan response, resolve after it has been sent
+    if not app_setting.DNS_ENRICH:
+        return
+
+    async def run(names: List[str]):
+        try:
+            await enrich_subdomains(domain_id, names)
+        except Exception as e:
+            logger.error(f"dns enrichment failed for domain {domain_id}: {str(e)}")
+
+    task = asyncio.create_task(run(list(names)))
+    _enrichment_tasks.add(task)
+    task.add_done_callback(_enrichment_tasks.discard)
+
+
+async def get_subdomain_data(domain: str, db: AsyncSession, user: User, listener: Optional[Callable] = None,
+                             deadline: Optional[float] = None) -> Dict[str, List[str]]:
+    try:
+        parsed_domain = normalize_domain(domain)
+        res = await enumerate_domain(parsed_domain, listener, deadline)
 
         if user:
-            find_domain = db.query(Domain).filter(
-                Domain.domain_name == parsed_domain, Domain.user_id == user.id).first()
-            if not find_domain:
-                find_domain = Domain(
-                    domain_name=parsed_domain, user_id=user.id
-                )
-                db.add(find_domain)
-                db.flush()
-
-            all_subs = list(res.subdomains) + list(res.wildcard_subdomains)
-            for i in all_subs:
-                sub = db.query(SubDomain).filter(SubDomain.name == i,
-                                                 SubDomain.domain_id == find_domain.id).first()
-                if not sub:
-                    sub = SubDomain(name=i, domain_id=find_domain.id)
-                    db.add(sub)
-            db.commit()
+            find_domain = await get_or_create_domain(db, parsed_domain, user.id)
+            await persist_subdomains(db, find_domain.id,
+                                     res.subdomains | res.wildcard_subdomains)
+            await db.commit()
+            schedule_enrichment(find_domain.id, res.subdomains)
         return {
             "domain": domain,
             "count": len(res.subdomains)+len(res.wildcard_subdomains),
             "regular": sorted(list(res.subdomains)),
-            "wildcards": sorted(list(res.wildcard_subdomains))
+            "wildcards": sorted(list(res.wildcard_subdomains)),
+            "sources": res.source_status,
+            "partial": res.partial
         }
     except Exception as e:
         print(e)
+        await db.rollback()
         raise HTTPException(
             status_code=500, detail=f"An error occurred: {str(e)}")
 
 
-def get_existing_subdomains(db: Session, domain_name: str, user_id: int) -> Set[str]:
-    domain = db.query(Domain).filter(Domain.domain_name ==
-                                     domain_name, Domain.user_id == user_id).first()
-    if domain:
-        return set(subdomain.name for subdomain in domain.sub_domains)
-    return set()
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
-async def get_updated_domains(domain: str, db: Session, user: User) -> Dict[str, any]:
-    try:
-        parsed_domain = urlparse(f"http://{domain}").netloc
-        res = SubDomainScrapper(parsed_domain)
-        data = await res.run_all_query_async()
+def _sse_names(names: List[str]) -> str:
+    return _sse('subdomains', {
+        'regular': [name for name in names if not name.startswith('*.')],
+        'wildcards': [name for name in names if name.startswith('*.')],
+    })
 
-        existing_subdomains = get_existing_subdomains(
-            db, parsed_domain, user.id)
-        all_subdomains = set(res.subdomains) | set(res.wildcard_subdomains)
-        new_subdomains = all_subdomains - existing_subdomains
 
-        db_domain = db.query(Domain).filter(
-            Domain.domain_name == parsed_domain, Domain.user_id == user.id).first()
-        if not db_domain:
-            db_domain = Domain(domain_name=parsed_domain, user_id=user_id)
-            db.add(db_domain)
-            db.flush()
+async def stream_subdomain_data(domain: str, user_id: Optional[int]) -> AsyncIterator[str]:
+    parsed_domain = normalize_domain(domain)
+    events: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(enumerate_domain(
+        parsed_domain, lambda source, status, scrapper: events.put_nowait((source, status, scrapper))))
+    scrapper: Optional[SubDomainScrapper] = None
+    sent = 0
+    try:
+        while True:
+            try:
+                source, source_status, scrapper = await asyncio.wait_for(events.get(), timeout=0.5)
+            except asyncio.TimeoutError:
+                source = None
+            # names first, so a "complete" event never arrives ahead of its results
+            if scrapper is not None and len(scrapper.discovered) > sent:
+                yield _sse_names(scrapper.discovered[sent:])
+                sent = len(scrapper.discovered)
+            if source is not None:
+                yield _sse('source', {'source': source, 'status': source_status,
+                                      'count': scrapper.source_count(source)})
+            elif task.done() and events.empty():
+                break
 
-        for subdomain in new_subdomains:
-            db_subdomain = SubDomain(name=subdomain, domain_id=db_domain.id)
-            db.add(db_subdomain)
+        try:
+            res = task.result()
+        except Exception as e:
+            logger.error(f"streamed enumeration failed for {parsed_domain}: {str(e)}")
+            yield _sse('failed', {'detail': 'An error occurred while searching'})
+            return
+        if len(res.discovered) > sent:
+            yield _sse_names(res.discovered[sent:])
+
+        if user_id:
+            async with AsyncSessionLocal() as db:
+                find_domain = await get_or_create_domain(db, parsed_domain, user_id)
+                await persist_subdomains(db, find_domain.id,
+                                         res.subdomains | res.wildcard_subdomains)
+                await db.commit()
+            schedule_enrichment(find_domain.id, res.subdomains)
+        yield _sse('done', {
+            'domain': domain,
+            'count': len(res.subdomains) + len(res.wildcard_subdomains),
+        })
+    finally:
+        # the shared scan keeps running for other callers, only this subscription goes away
+        if not task.done():
+            task.cancel()
+
+
+async def get_updated_domains(domain: str, db: AsyncSession, user: User, listener: Optional[Callable] = None,
+                              deadline: Optional[float] = None) -> Dict[str, any]:
+    try:
+        parsed_domain = normalize_domain(domain)
+        res = await enumerate_domain(parsed_domain, listener, deadline)
 
-        db.commit()
+        all_subdomains = set(res.subdomains) | set(res.wildcard_subdomains)
+        db_domain = await get_or_create_domain(db, parsed_domain, user.id)
+        diff = await persist_subdomains(db, db_domain.id, all_subdomains)
+        await db.commit()
+        schedule_enrichment(db_domain.id, res.subdomains)
+        # a source that did not finish would show up as removals, so only scans where
+        # every source completed (or was served from cache) report them
+        failed_sources = res.failed_sources
+        removed_subdomains = [] if res.partial or failed_sources else diff.removed
 
         return {
             "domain": domain,
             "total_count": len(all_subdomains),
             "regular": sorted(list(res.subdomains)),
             "wildcards": sorted(list(res.wildcard_subdomains)),
-            "new_subdomains": sorted(list(new_subdomains)),
-            "new_count": len(new_subdomains) > 0
+            "new_subdomains": diff.new,
+            "new_count": len(diff.new) > 0,
+            "removed_subdomains": removed_subdomains,
+            "failed_sources": failed_sources,
+            "sources": res.source_status,
+            "partial": res.partial
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500, detail=f"An error occurred: {str(e)}")
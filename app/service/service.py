@@ -1,4 +1,7 @@
+import asyncio
+import base64
 import bcrypt
+import json
 import logging
 
 from datetime import datetime, timedelta
@@ -6,13 +9,17 @@ from typing import Optional, List, Tuple
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import column, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from fastapi.responses import RedirectResponse
 
 
 from app.core.core import app_setting
-from app.schema.schema import TokenData, UserCreate, UserBase, ApiResponseModel, ProfileResponse
-from app.database.database import get_database, User, Domain, SubDomain
+from app.schema.schema import TokenData, UserCreate, UserBase, ApiResponseModel, ProfileResponse, ProfileDomain, DomainSummary, SubDomainSearchItem
+from app.database.database import get_async_database, User, Domain, SubDomain
+from app.service.auth_cache import get_principal_cache
+from app.service.search_enumerator import reverse_labels
 
 
 logger = logging.getLogger(__name__)
@@ -35,6 +42,11 @@ def get_user(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
 
+async def find_user(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+
 def login_user(db: Session, email: str, password: str):
     user: User = get_user(db, email)
     if not user or not verify_password(password, user.password):
@@ -64,7 +76,7 @@ def create_access_token(data: dict, expiry: Optional[timedelta] = None):
         "expiresAt": expire
     }
 
-async def get_user_from_cookie(req:Request, db:Session = Depends(get_database)):
+async def get_user_from_cookie(req:Request, db:AsyncSession = Depends(get_async_database)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="oops, seems you are not authorized",
@@ -79,12 +91,18 @@ async def get_user_from_cookie(req:Request, db:Session = Depends(get_database)):
         token = access_token.split()[1]
         return await get_auth_user(db=db, token=token)
 
-async def get_auth_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_database)):
+async def get_auth_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_database)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="oops, seems you are not authorized",
         headers={"WWW-Authenticate": "Bearer"}
     )
+    cache = get_principal_cache()
+    user = cache.get(token)
+    if user is not None:
+        return user
+    if cache.is_revoked(token):
+        raise credentials_exception
     try:
         payload = jwt.decode(
             token,
@@ -97,24 +115,41 @@ async def get_auth_user(token: str = Depends(oauth2_scheme), db: Session = Depen
         token_data = UserBase(email=email)
     except JWTError:
         raise credentials_exception
-    user = get_user(db, email=token_data.email)
+    user = await find_user(db, email=token_data.email)
     if user is None:
         raise credentials_exception
+    # the cached instance outlives this session, detach it so no request can lazy load through it
+    db.expunge(user)
+    cache.set(token, user, payload.get("exp"))
     return user
 
 
-def create_new_user(db: Session, user: UserCreate):
-    find_user = get_user(db, email=user.email)
-    if find_user:
+def logout_user(req: Request):
+    access_token = req.cookies.get("dom_explorer")
+    if not access_token or len(access_token.split()) != 2:
+        return
+    token = access_token.split()[1]
+    try:
+        payload = jwt.decode(token, app_setting.JWT_TOKEN, algorithms=[app_setting.ALGORITHM])
+    except JWTError:
+        return
+    get_principal_cache().revoke(token, payload.get("exp"))
+    logger.info(f"user logout from {payload.get('email')}")
+
+
+async def create_new_user(db: AsyncSession, user: UserCreate):
+    existing_user = await find_user(db, email=user.email)
+    if existing_user:
         raise HTTPException(
             status_code=400, detail="oops, email already registered")
-    hashed_password = get_password_hash(user.password)
+    # bcrypt is deliberately slow, keep it off the event loop
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
     created_user = User(
         email=user.email, password=hashed_password, role=user.role)
     token = create_access_token(data={"email": created_user.email})
     db.add(created_user)
-    db.commit()
-    db.refresh(created_user)
+    await db.commit()
+    await db.refresh(created_user)
     logger.info(f"new account created by {created_user.email}")
     return {
         "message": "successfully created account",
@@ -131,16 +166,43 @@ def isAdmin(user: User = Depends(get_auth_user)):
     return user
 
 
-def get_user_relation(db: Session, email: str):
-    return db.query(User).options(
-        joinedload(User.domains).joinedload(Domain.sub_domains)
-    ).filter(User.email == email).first()
-
-
-def get_my_profile(user: User, db: Session):
+async def get_domain_summaries(db: AsyncSession, user: User, after: Optional[str] = None,
+                               limit: Optional[int] = None) -> Tuple[List[ProfileDomain], Optional[str]]:
+    # per-domain aggregates as correlated subqueries: each one is an index seek on
+    # (domain_id, last_seen) or (domain_id, name), so cost does not grow with history
+    last_scanned_at = select(func.max(SubDomain.last_seen)).where(
+        SubDomain.domain_id == Domain.id).correlate(Domain).scalar_subquery()
+    wildcard_count = select(func.count()).where(
+        SubDomain.domain_id == Domain.id,
+        SubDomain.name >= "*.", SubDomain.name < "*/").correlate(Domain).scalar_subquery()
+    query = select(Domain, last_scanned_at, wildcard_count).where(Domain.user_id == user.id)
+    if limit is None:
+        result = await db.execute(query.order_by(Domain.id))
+        rows, next_cursor = list(result.all()), None
+    else:
+        result = await db.execute(_keyset_page(query, Domain.id, "id", after, limit))
+        rows = list(result.all())
+        next_cursor = None
+        if len(rows) > limit:
+            del rows[limit:]
+            next_cursor = encode_cursor("id", rows[-1][0].id)
+    return [
+        ProfileDomain(
+            id=domain.id,
+            domain=domain.domain_name,
+            isActive=domain.isActive,
+            createdDate=domain.createdDate,
+            sub_domain_count=domain.sub_domain_count or 0,
+            wildcard_count=wildcards or 0,
+            last_scanned_at=last_scanned,
+        ) for domain, last_scanned, wildcards in rows
+    ], next_cursor
+
+
+async def get_my_profile(user: User, db: AsyncSession, after: Optional[str] = None, limit: int = 20):
     logger.info(f"getting user profile {user.email}")
-    data: User = get_user_relation(db, email=user.email)
-    map_profile = map_user_with_domain_response(data)
+    domains, next_cursor = await get_domain_summaries(db, user, after=after, limit=limit)
+    map_profile = map_user_with_domain_response(user, domains, next_cursor)
     return ApiResponseModel(
         message="successful",
         status_code=status.HTTP_200_OK,
@@ -148,26 +210,14 @@ def get_my_profile(user: User, db: Session):
     )
 
 
-def map_user_with_domain_response(user: User) -> ProfileResponse:
+def map_user_with_domain_response(user: User, domains: List[ProfileDomain], next_cursor: Optional[str] = None) -> ProfileResponse:
     return ProfileResponse(
         id=str(user.id),
         email=user.email,
         role=user.role,
         created_date=user.createdDate,
-        domains=[
-            ProfileDomain(
-                id=domain.id,
-                domain=domain.domain_name,
-                isActive=domain.isActive,
-                createdDate=domain.createdDate,
-                sub_domain=[
-                    SubDomainResponse(
-                        regular=sub_domain.regular,
-                        wildcards=sub_domain.wildcards,
-                    ) for sub_domain in domain.sub_domains
-                ]
-            ) for domain in user.domains
-        ]
+        domains=domains,
+        next_cursor=next_cursor
     )
     
 
@@ -175,24 +225,153 @@ def get_domain_by_id(user: User, db: Session) -> Domain:
     return db.query(Domain).filter(Domain.user_id == user_id).all()
 
 
-def get_user_domains(db: Session, user: User, skip: int = 0, limit: int = 10) -> Tuple[List[Domain], int]:
-    query = db.query(Domain).filter(Domain.user_id == user.id)
-    total = query.count()
-    domains = query.offset(skip).limit(limit).all()
-    return domains, total
+def encode_cursor(order: str, value) -> str:
+    payload = json.dumps({"o": order, "v": value}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
 
 
-def get_user_domain_with_subdomains(db: Session, user: User, id: int, skip: int = 0, limit: int = 10) -> Tuple[Domain, int]:
-    domain:Domain = db.query(Domain).filter(
+def decode_cursor(cursor: str, order: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["o"] != order:
+            raise ValueError("cursor was issued for a different ordering")
+        return payload["v"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid cursor: {str(e)}")
+
+
+def _keyset_page(query, key, order: str, after: Optional[str], limit: int):
+    # seek past the last key of the previous page instead of OFFSET, so every page costs the same
+    if after is not None:
+        query = query.where(key > decode_cursor(after, order))
+    return query.order_by(key).limit(limit + 1)
+
+
+def _next_cursor(rows: list, key_attr: str, order: str, limit: int) -> Optional[str]:
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    return encode_cursor(order, getattr(rows[-1], key_attr))
+
+
+def map_domain_summary(domain: Domain) -> DomainSummary:
+    return DomainSummary(
+        id=domain.id,
+        domain=domain.domain_name,
+        isActive=domain.isActive,
+        createdDate=domain.createdDate,
+        sub_domain_count=domain.sub_domain_count or 0,
+    )
+
+
+async def get_user_domains(db: AsyncSession, user: User, after: Optional[str] = None, limit: int = 10,
+                           order: str = "id", include_total: bool = False) -> Tuple[List[Domain], Optional[int], Optional[str]]:
+    key_attr = "domain_name" if order == "name" else "id"
+    query = select(Domain).where(Domain.user_id == user.id)
+    result = await db.execute(_keyset_page(query, getattr(Domain, key_attr), order, after, limit))
+    domains = list(result.scalars().all())
+    next_cursor = _next_cursor(domains, key_attr, order, limit)
+    total = None
+    if include_total:
+        total = await db.scalar(select(func.count(Domain.id)).where(Domain.user_id == user.id))
+    return domains, total, next_cursor
+
+
+async def get_user_domain_with_subdomains(db: AsyncSession, user: User, id: int, after: Optional[str] = None,
+                                          limit: int = 10, order: str = "id",
+                                          live: Optional[bool] = None) -> Tuple[Optional[Domain], List[SubDomain], Optional[str]]:
+    domain: Domain = await db.scalar(select(Domain).where(
         Domain.id == id,
         Domain.user_id == user.id
-    ).first()
+    ))
 
     if domain:
-        subdomains_query = db.query(SubDomain).filter(
-            SubDomain.domain_id == domain.id)
-        total_subdomains = subdomains_query.count()
-        subdomains = subdomains_query.offset(skip).limit(limit).all()
-        domain.sub_domains = subdomains
-        return domain, total_subdomains
-    return None, 0
\ No newline at end of file
+        key_attr = "name" if order == "name" else "id"
+        query = select(SubDomain).where(SubDomain.domain_id == domain.id)
+        if live is not None:
+            # (domain_id, is_live, id) index, live-only pages by id stay a range scan
+            query = query.where(SubDomain.is_live.is_(live))
+        result = await db.execute(_keyset_page(query, getattr(SubDomain, key_attr), order, after, limit))
+        subdomains = list(result.scalars().all())
+        return domain, subdomains, _next_cursor(subdomains, key_attr, order, limit)
+    return None, [], None
+
+
+SEARCH_MODES = ("suffix", "prefix", "contains")
+
+
+def _upper_bound(prefix: str) -> str:
+    # smallest string greater than every string starting with prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+async def search_subdomains(db: AsyncSession, user: Optional[User], q: str, mode: str = "suffix",
+                            after: Optional[str] = None, limit: int = 50,
+                            domain_id: Optional[int] = None,
+                            live: Optional[bool] = None) -> Tuple[List[SubDomainSearchItem], Optional[str]]:
+    """suffix and zone lookups seek the reversed_name index, prefix lookups the
+    (domain_id, name) index and substring lookups the trigram fts index."""
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="oops, seems you are not authorized")
+    term = q.strip().lower().rstrip(".")
+    if mode == "suffix":
+        term = term.removeprefix("*.").lstrip(".")
+    if not term:
+        raise HTTPException(status_code=400, detail="search term is empty")
+
+    owned = select(Domain.id).where(Domain.user_id == user.id)
+    if domain_id is not None:
+        owned = owned.where(Domain.id == domain_id)
+    query = select(SubDomain, Domain.domain_name).join(Domain, SubDomain.domain_id == Domain.id).where(
+        SubDomain.domain_id.in_(owned))
+    if live is not None:
+        query = query.where(SubDomain.is_live.is_(live))
+
+    if mode == "suffix":
+        low = reverse_labels(term)
+        query = query.where(SubDomain.reversed_name >= low, SubDomain.reversed_name < _upper_bound(low))
+        if after is not None:
+            try:
+                reversed_name, last_id = decode_cursor(after, mode)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="invalid cursor")
+            query = query.where(tuple_(SubDomain.reversed_name, SubDomain.id) > tuple_(reversed_name, last_id))
+        query = query.order_by(SubDomain.reversed_name, SubDomain.id)
+    else:
+        if mode == "prefix":
+            query = query.where(SubDomain.name >= term, SubDomain.name < _upper_bound(term))
+        elif db.get_bind().dialect.name == "sqlite":
+            if len(term) < 3:
+                raise HTTPException(status_code=400, detail="contains search needs at least 3 characters")
+            phrase = '"' + term.replace('"', '""') + '"'
+            matches = text("SELECT rowid FROM sub_domain_fts WHERE sub_domain_fts MATCH :phrase").bindparams(
+                phrase=phrase).columns(column("rowid"))
+            query = query.where(SubDomain.id.in_(matches))
+        else:
+            query = query.where(SubDomain.name.contains(term, autoescape=True))
+        if after is not None:
+            query = query.where(SubDomain.id > decode_cursor(after, mode))
+        query = query.order_by(SubDomain.id)
+
+    result = await db.execute(query.limit(limit + 1))
+    rows = list(result.all())
+    next_cursor = None
+    if len(rows) > limit:
+        del rows[limit:]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(mode, [last.reversed_name, last.id] if mode == "suffix" else last.id)
+    return [
+        SubDomainSearchItem(
+            id=sub_domain.id,
+            name=sub_domain.name,
+            domain=domain_name,
+            first_seen=sub_domain.first_seen,
+            last_seen=sub_domain.last_seen,
+            seen_count=sub_domain.seen_count or 1,
+            is_live=sub_domain.is_live,
+            addresses=sub_domain.addresses,
+            cname=sub_domain.cname,
+            resolved_at=sub_domain.resolved_at,
+        ) for sub_domain, domain_name in rows
+    ], next_cursor
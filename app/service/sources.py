@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from app.core.core import app_setting
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """async token bucket, callers wait in order until a token is available."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` failures in a row (or a 429),
+    open -> half_open once `reset_timeout` has passed, which lets one probe
+    through; the probe's outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_for = reset_timeout
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_for:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self, retry_after: Optional[float] = None):
+        now = time.monotonic()
+        open_until = now + max(self.reset_timeout, retry_after or 0)
+        if self.state == self.OPEN:
+            # a late failure from an in-flight request must not cut short an upstream Retry-After
+            open_until = max(open_until, self.opened_at + self.open_for)
+        self.state = self.OPEN
+        self.opened_at = now
+        self.open_for = open_until - now
+
+
+class SourceRegistry:
+    """process-wide rate limit, concurrency and health state for every enumerator backend.
+
+    every source query of every scan (single, job or batch) runs inside a
+    slot: one per-source semaphore and one overall semaphore, so a batch of
+    hundreds of domains is scheduled by the same caps as a single search.
+    """
+
+    def __init__(self, rates: Dict[str, float], default_rate: float, burst: float,
+                 failure_threshold: int, reset_timeout: float, concurrency: Optional[Dict[str, int]] = None,
+                 default_concurrency: int = 4, max_concurrency: int = 32):
+        self.rates = rates
+        self.default_rate = default_rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.concurrency = concurrency or {}
+        self.default_concurrency = default_concurrency
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._overall = asyncio.Semaphore(max_concurrency)
+
+    def bucket(self, source: str) -> TokenBucket:
+        if source not in self._buckets:
+            self._buckets[source] = TokenBucket(self.rates.get(source, self.default_rate), self.burst)
+        return self._buckets[source]
+
+    def breaker(self, source: str) -> CircuitBreaker:
+        if source not in self._breakers:
+            self._breakers[source] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[source]
+
+    def semaphore(self, source: str) -> asyncio.Semaphore:
+        if source not in self._semaphores:
+            self._semaphores[source] = asyncio.Semaphore(self.concurrency.get(source, self.default_concurrency))
+        return self._semaphores[source]
+
+    def busy(self, source: str) -> bool:
+        return self.semaphore(source).locked() or self._overall.locked()
+
+    @asynccontextmanager
+    async def slot(self, source: str) -> AsyncIterator[None]:
+        # per-source first, so queries waiting on a saturated source do not hold overall slots
+        async with self.semaphore(source):
+            async with self._overall:
+                yield
+
+    async def acquire(self, source: str):
+        await self.bucket(source).acquire()
+
+    def allow(self, source: str) -> bool:
+        return self.breaker(source).allow()
+
+    def record(self, source: str, ok: bool):
+        breaker = self.breaker(source)
+        was = breaker.state
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        if breaker.state != was:
+            logger.warning(f"circuit for {source} went from {was} to {breaker.state}")
+
+    def throttled(self, source: str, retry_after: Optional[float] = None):
+        self.breaker(source).trip(retry_after)
+        logger.warning(f"{source} is throttling us, circuit open for {self.breaker(source).open_for}s")
+
+    def states(self) -> Dict[str, str]:
+        return {source: breaker.state for source, breaker in self._breakers.items()}
+
+
+_registry: Optional[SourceRegistry] = None
+
+
+def get_source_registry() -> SourceRegistry:
+    global _registry
+    if _registry is None:
+        _registry = SourceRegistry(
+            rates=app_setting.SOURCE_RATE_LIMITS,
+            default_rate=app_setting.SOURCE_RATE_LIMIT,
+            burst=app_setting.SOURCE_BURST,
+            failure_threshold=app_setting.SOURCE_FAILURE_THRESHOLD,
+            reset_timeout=app_setting.SOURCE_RESET_TIMEOUT,
+            concurrency=app_setting.SOURCE_CONCURRENCIES,
+            default_concurrency=app_setting.SOURCE_CONCURRENCY,
+            max_concurrency=app_setting.SCAN_MAX_CONCURRENCY,
+        )
+    return _registry
@@ -3,61 +3,104 @@ document.addEventListener("DOMContentLoaded", function () {
   const resultsSection = document.getElementById("results");
   const resultsContent = document.getElementById("resultsContent");
   const loader = document.getElementById("loader");
+  let eventSource = null;
 
   loader.classList.add("hidden");
 
-  searchForm.addEventListener("submit", async function (e) {
+  searchForm.addEventListener("submit", function (e) {
     e.preventDefault();
     const domain = document.getElementById("domainInput").value;
 
+    if (eventSource) {
+      eventSource.close();
+    }
+
     // Show loader only when search is initiated
     loader.classList.remove("hidden");
-    resultsSection.classList.add("hidden");
+    const view = renderResultsShell();
+    resultsSection.classList.remove("hidden");
 
-    try {
-      const response = await fetch(
-        `/api/v1/search?domain=${encodeURIComponent(domain)}`
-      );
+    // results are pushed per source as they arrive instead of after the whole scan
+    eventSource = new EventSource(
+      `/api/v1/search/stream?domain=${encodeURIComponent(domain)}`
+    );
 
-      if (response.status === 401) {
-        window.location.href = "/auth/login";
-        return;
+    eventSource.addEventListener("subdomains", function (event) {
+      const data = JSON.parse(event.data);
+      appendItems(view.regular, data.regular);
+      appendItems(view.wildcards, data.wildcards);
+      view.count.textContent =
+        view.regular.children.length + view.wildcards.children.length;
+    });
+
+    eventSource.addEventListener("source", function (event) {
+      const data = JSON.parse(event.data);
+      let item = view.sources.querySelector(`[data-source="${data.source}"]`);
+      if (!item) {
+        item = document.createElement("li");
+        item.dataset.source = data.source;
+        view.sources.appendChild(item);
       }
+      item.textContent = `${data.source}: ${data.status} (${data.count})`;
+    });
+
+    eventSource.addEventListener("done", function (event) {
+      const data = JSON.parse(event.data);
+      view.count.textContent = data.count;
+      finish();
+    });
+
+    eventSource.addEventListener("failed", function () {
+      view.status.textContent =
+        "An error occurred while searching. Please try again.";
+      finish();
+    });
 
-      if (!response.ok) {
-        throw new Error("Search failed");
+    eventSource.onerror = function () {
+      // the server closes the stream after "done", anything else is a real failure
+      if (eventSource && eventSource.readyState !== EventSource.CLOSED) {
+        view.status.textContent =
+          "An error occurred while searching. Please try again.";
       }
+      finish();
+    };
+  });
 
-      const data = await response.json();
-      displayResults(data);
-    } catch (error) {
-      console.error("Error:", error);
-      resultsContent.innerHTML =
-        "<p>An error occurred while searching. Please try again.</p>";
-      resultsSection.classList.remove("hidden");
-    } finally {
-      loader.classList.add("hidden");
+  function finish() {
+    if (eventSource) {
+      eventSource.close();
+      eventSource = null;
     }
-  });
+    loader.classList.add("hidden");
+  }
 
-  function displayResults(data) {
-    let html = `
-            <p>Total subdomains found: ${data.count}</p>
+  function renderResultsShell() {
+    resultsContent.innerHTML = `
+            <p>Total subdomains found: <span id="resultCount">0</span></p>
+            <p id="resultStatus"></p>
+            <h4>Sources:</h4>
+            <ul id="sourceList"></ul>
             <h4>Regular Subdomains:</h4>
-            <ul>
-                ${data.regular
-                  .map((subdomain) => `<li>${subdomain}</li>`)
-                  .join("")}
-            </ul>
+            <ul id="regularList"></ul>
             <h4>Wildcard Subdomains:</h4>
-            <ul>
-                ${data.wildcards
-                  .map((subdomain) => `<li>${subdomain}</li>`)
-                  .join("")}
-            </ul>
+            <ul id="wildcardList"></ul>
         `;
+    return {
+      count: document.getElementById("resultCount"),
+      status: document.getElementById("resultStatus"),
+      sources: document.getElementById("sourceList"),
+      regular: document.getElementById("regularList"),
+      wildcards: document.getElementById("wildcardList"),
+    };
+  }
 
-    resultsContent.innerHTML = html;
-    resultsSection.classList.remove("hidden");
+  function appendItems(list, names) {
+    const fragment = document.createDocumentFragment();
+    names.forEach((subdomain) => {
+      const item = document.createElement("li");
+      item.textContent = subdomain;
+      fragment.appendChild(item);
+    });
+    list.appendChild(fragment);
   }
 });
@@ -1,5 +1,7 @@
 let currentDomainId = null;
 let currentPage = 1;
+// cursors[i] is the `after` token that loads page i + 1
+let cursors = [null];
 const itemsPerPage = 10;
 
 document.addEventListener("DOMContentLoaded", function () {
@@ -10,8 +12,12 @@ document.addEventListener("DOMContentLoaded", function () {
   viewButtons.forEach((button) => {
     button.addEventListener("click", function () {
       currentDomainId = this.getAttribute("data-domain-id");
+      // subdomain lists are only loaded when a domain is opened
+      document.getElementById("modalDomainName").textContent =
+        this.getAttribute("data-domain-name");
       currentPage = 1;
-      fetchSubdomains(currentDomainId, 0, itemsPerPage);
+      cursors = [null];
+      fetchSubdomains(currentDomainId, null, itemsPerPage);
     });
   });
 
@@ -26,11 +32,13 @@ document.addEventListener("DOMContentLoaded", function () {
   });
 });
 
-async function fetchSubdomains(domainId, skip, limit) {
+async function fetchSubdomains(domainId, after, limit) {
   try {
-    const response = await fetch(
-      `/api/v1/domains/${domainId}?skip=${skip}&limit=${limit}`
-    );
+    const params = new URLSearchParams({ limit: limit });
+    if (after) {
+      params.set("after", after);
+    }
+    const response = await fetch(`/api/v1/domains/${domainId}?${params}`);
     if (!response.ok) {
       throw new Error("Failed to fetch subdomains");
     }
@@ -64,7 +72,7 @@ function displaySubdomains(data) {
     tableHTML += `
       <tr>
         <td>${subdomain.name}</td>
--        <td>${subdomain.isActive ? "Active" : "Active"}</td>
+        <td>Active</td>
         <td>${new Date(subdomain.createdDate).toLocaleString()}</td>
       </tr>
     `;
@@ -83,7 +91,8 @@ function displaySubdomains(data) {
 function updatePagination(data) {
   const pagination = document.getElementById("pagination");
   pagination.innerHTML = "";
-  const totalPages = Math.ceil(data.total_subdomains / itemsPerPage);
+  const totalPages = Math.max(1, Math.ceil(data.total_subdomains / itemsPerPage));
+  cursors[currentPage] = data.next_cursor;
 
   if (currentPage > 1) {
     pagination.innerHTML += `<button onclick="window.changePage(${
@@ -91,15 +100,10 @@ function updatePagination(data) {
     })">Previous</button>`;
   }
 
-  for (let i = 1; i <= totalPages; i++) {
-    if (i === currentPage) {
-      pagination.innerHTML += `<span>${i}</span>`;
-    } else {
-      pagination.innerHTML += `<button onclick="window.changePage(${i})">${i}</button>`;
-    }
-  }
+  pagination.innerHTML += `<span>${currentPage} of ${totalPages}</span>`;
 
-  if (currentPage < totalPages) {
+  // pages are walked with cursors, so only neighbouring pages can be jumped to
+  if (data.next_cursor) {
     pagination.innerHTML += `<button onclick="window.changePage(${
       currentPage + 1
     })">Next</button>`;
@@ -109,6 +113,5 @@ function updatePagination(data) {
 // Make changePage function globally accessible
 window.changePage = function (newPage) {
   currentPage = newPage;
-  const skip = (currentPage - 1) * itemsPerPage;
-  fetchSubdomains(currentDomainId, skip, itemsPerPage);
+  fetchSubdomains(currentDomainId, cursors[currentPage - 1], itemsPerPage);
 };
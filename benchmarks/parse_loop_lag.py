@@ -0,0 +1,74 @@
+"""measure event loop lag while large source pages are parsed.
+
+    python -m benchmarks.parse_loop_lag [--size-mb 8] [--pages 4]
+
+a ticker coroutine asks to wake up every millisecond and records how late it
+actually runs while netcraft-style pages are parsed inline on the loop, on
+the thread pool and on the process pool.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.core.core import app_setting
+from app.service import parsers
+
+
+def build_page(size_mb: float) -> str:
+    row = '<tr><td><a class="results-table__host" href="https://host{0}.example.com/">host{0}</a></td></tr>\n'
+    rows, size, i = [], 0, 0
+    while size < size_mb * 1024 * 1024:
+        line = row.format(i)
+        rows.append(line)
+        size += len(line)
+        i += 1
+    return "".join(rows)
+
+
+async def ticker(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - start - 0.001) * 1000)
+
+
+async def measure(mode: str, page: str, pages: int):
+    lags: list = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    if mode == "inline":
+        for _ in range(pages):
+            parsers.extract_netcraft_hosts(page)
+            await asyncio.sleep(0)
+    else:
+        await asyncio.gather(*(parsers.run_parser(parsers.extract_netcraft_hosts, page) for _ in range(pages)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1]
+    print(f"{mode:8} total {elapsed * 1000:8.1f} ms | loop lag max {lags[-1]:8.1f} ms"
+          f" p99 {p99:7.1f} ms median {statistics.median(lags):5.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--pages", type=int, default=4)
+    args = parser.parse_args()
+
+    page = build_page(args.size_mb)
+    app_setting.PARSE_OFFLOAD_THRESHOLD = 0
+    await measure("inline", page, args.pages)
+    for executor in ("thread", "process"):
+        parsers.shutdown_parse_executor()
+        app_setting.PARSE_EXECUTOR = executor
+        await measure(executor, page, args.pages)
+    parsers.shutdown_parse_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
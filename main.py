@@ -1,6 +1,7 @@
 import uvicorn
 import logging
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
 from fastapi.exceptions import RequestValidationError
@@ -9,16 +10,32 @@ from fastapi.staticfiles import StaticFiles
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
-from app.database.database import Base, engine, User, get_database
+from app.database.database import Base, engine, async_engine, async_reader_engine, User, get_async_database
 from app.core.core import app_setting, limiter
 from app.controllers.controllers import router as routes
-from app.service.service import get_user_from_cookie
+from app.service.service import get_user_from_cookie, get_domain_summaries
+from app.service.http_client import get_http_pool, close_http_pool
+from app.service.jobs import get_job_manager
+from app.service.parsers import shutdown_parse_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_http_pool()
+    await get_job_manager().start()
+    yield
+    await get_job_manager().stop()
+    await close_http_pool()
+    shutdown_parse_executor()
+    await async_engine.dispose()
+    await async_reader_engine.dispose()
+
 
 app = FastAPI(title=app_setting.APP_NAME, version="1.0.0",
-              description="some OSINT tool")
+              description="some OSINT tool", lifespan=lifespan)
 
 logger = logging.getLogger(__name__)
 
@@ -45,14 +62,14 @@ async def user_login_page(request: Request):
 
 
 @app.get("/profile")
-async def user_profile_page(request: Request, current_user: User = Depends(get_user_from_cookie), db: Session = Depends(get_database)):
+async def user_profile_page(request: Request, current_user: User = Depends(get_user_from_cookie), db: AsyncSession = Depends(get_async_database)):
     if not current_user:
         return RedirectResponse(url="/login")
     
     return templates.TemplateResponse(request=request, name="profile.html", context={
         "request": request,
         "user": current_user,
-        "search": current_user.domains,
+        "search": (await get_domain_summaries(db, current_user))[0],
         "name": get_name_from_email(current_user.email)
     })
 